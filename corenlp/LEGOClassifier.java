@@ -1,11 +1,26 @@
 
 import java.io.*;
+import java.lang.management.ManagementFactory;
+import java.lang.management.MemoryPoolMXBean;
+import java.lang.management.MemoryType;
+import java.nio.ByteBuffer;
+import java.nio.ByteOrder;
 import java.text.DecimalFormat;
 import java.text.NumberFormat;
+import java.util.ArrayDeque;
 import java.util.ArrayList;
+import java.util.Arrays;
 import java.util.Collections;
 import java.util.List;
 import java.util.Properties;
+import java.util.concurrent.ArrayBlockingQueue;
+import java.util.concurrent.BlockingQueue;
+import java.util.concurrent.Callable;
+import java.util.concurrent.ExecutionException;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.Future;
+import java.util.concurrent.FutureTask;
 
 import edu.stanford.nlp.ling.*;
 import edu.stanford.nlp.process.DocumentPreprocessor;
@@ -32,7 +47,12 @@ import edu.stanford.nlp.util.Generics;
  * <code>-sentimentModel</code> Which sentiment model to use, defaults to sentiment.ser.gz <br>
  * <code>-file</code> Which file to process. <br>
  * <code>-stdin</code> Read one line at a time from stdin. <br>
+ * <code>-server</code> Keep the models loaded and classify one review per stdin line, answering each with one line on stdout. <br>
+ * <code>-parseOnly</code> Print the reviews of -file as binarized parse trees, for -input TREES. <br>
+ * <code>-threads</code> Classify this many reviews of -file or -server in parallel, output stays in input order.  Defaults to 1. <br>
+ * <code>-annotators</code> minimal: tokenize, ssplit, parse, sentiment.  full: also pos, lemma, ner and dcoref, the default.  Any other value is used as the annotator list. <br>
  * <code>-output</code> pennTrees: Output trees with scores at each binarized node.  vectors: Number tree nodes and print out the vectors.  probabilities: Output the scores for different labels for each node. Defaults to printing just the root. <br>
+ * <code>-binaryOutput</code> prefix: Write the -stdin trees as little endian int32 node and float32 prediction and vector arrays instead of text. <br>
  * <code>-filterUnknown</code> remove unknown trees from the input.  Only applies to TREES input, in which case the trees must be binarized with sentiment labels <br>
  * <code>-help</code> Print out help <br>
  *
@@ -172,16 +192,472 @@ public class LEGOClassifier {
         }
     }
 
+    /**
+     * Writes sentiment trees as flat little endian arrays which numpy
+     * maps without parsing, instead of one formatted number per print:
+     * <br>
+     * <code>prefix.nodes</code> int32 (nodes x 5): sentence, parent node
+     * (-1 for a root), predicted class, first token, end token <br>
+     * <code>prefix.probabilities</code> float32 (nodes x classes) <br>
+     * <code>prefix.vectors</code> float32 (nodes x hidden) <br>
+     * <code>prefix.sentences.txt</code> the text of every sentence <br>
+     * <code>prefix.json</code> the shapes, written on close <br>
+     * Nodes are numbered like setIndexLabels does, leaves are left out.
+     */
+    static class BinaryTreeWriter implements Closeable {
+        static final String[] NODE_COLUMNS = {"sentence", "parent", "predicted_class", "begin", "end"};
+
+        private final String prefix;
+        private final OutputStream nodes;
+        private final OutputStream probabilities;
+        private final OutputStream vectors;
+        private final PrintStream sentences;
+        private ByteBuffer buffer = ByteBuffer.allocate(1024).order(ByteOrder.LITTLE_ENDIAN);
+        // node table rows of the current sentence, in preorder; a row is complete once its subtree is written
+        private int[] rows = new int[64 * NODE_COLUMNS.length];
+        private int sentenceNodes = 0;
+        private int nodeCount = 0;
+        private int sentenceCount = 0;
+        private int classes = 0;
+        private int hidden = 0;
+
+        BinaryTreeWriter(String prefix) throws IOException {
+            this.prefix = prefix;
+            nodes = new BufferedOutputStream(new FileOutputStream(prefix + ".nodes"), 1 << 16);
+            probabilities = new BufferedOutputStream(new FileOutputStream(prefix + ".probabilities"), 1 << 16);
+            vectors = new BufferedOutputStream(new FileOutputStream(prefix + ".vectors"), 1 << 16);
+            sentences = new PrintStream(new FileOutputStream(prefix + ".sentences.txt"), false, "utf-8");
+        }
+
+        private ByteBuffer bufferFor(int bytes) {
+            if (buffer.capacity() < bytes) {
+                buffer = ByteBuffer.allocate(bytes).order(ByteOrder.LITTLE_ENDIAN);
+            }
+            buffer.clear();
+            return buffer;
+        }
+
+        private void writeInts(OutputStream out, int[] values, int length) throws IOException {
+            ByteBuffer bytes = bufferFor(4 * length);
+            for (int i = 0; i < length; ++i) {
+                bytes.putInt(values[i]);
+            }
+            out.write(bytes.array(), 0, bytes.position());
+        }
+
+        private void writeFloats(OutputStream out, SimpleMatrix matrix) throws IOException {
+            ByteBuffer bytes = bufferFor(4 * matrix.getNumElements());
+            for (int i = 0; i < matrix.getNumElements(); ++i) {
+                bytes.putFloat((float) matrix.get(i));
+            }
+            out.write(bytes.array(), 0, bytes.position());
+        }
+
+        /**
+         * Writes the predictions and vectors of the subtree in preorder
+         * and fills in its node rows.  Returns the token after the subtree,
+         * which is the end of its span, so every leaf is only counted once.
+         */
+        private int writeNode(Tree tree, int parent, int firstToken) throws IOException {
+            if (tree.isLeaf()) {
+                return firstToken + 1;
+            }
+            int index = nodeCount++;
+            int row = NODE_COLUMNS.length * sentenceNodes++;
+            if (rows.length < row + NODE_COLUMNS.length) {
+                rows = Arrays.copyOf(rows, 2 * rows.length);
+            }
+            SimpleMatrix predictions = RNNCoreAnnotations.getPredictions(tree);
+            SimpleMatrix vector = RNNCoreAnnotations.getNodeVector(tree);
+            classes = predictions.getNumElements();
+            hidden = vector.getNumElements();
+            writeFloats(probabilities, predictions);
+            writeFloats(vectors, vector);
+            int token = firstToken;
+            for (Tree child : tree.children()) {
+                token = writeNode(child, index, token);
+            }
+            rows[row] = sentenceCount;
+            rows[row + 1] = parent;
+            rows[row + 2] = RNNCoreAnnotations.getPredictedClass(tree);
+            rows[row + 3] = firstToken;
+            rows[row + 4] = token;
+            return token;
+        }
+
+        void write(CoreMap sentence) throws IOException {
+            sentenceNodes = 0;
+            writeNode(sentence.get(SentimentCoreAnnotations.SentimentAnnotatedTree.class), -1, 0);
+            writeInts(nodes, rows, NODE_COLUMNS.length * sentenceNodes);
+            sentences.println(sentence.get(CoreAnnotations.TextAnnotation.class).replace('\n', ' '));
+            sentenceCount++;
+        }
+
+        public void close() throws IOException {
+            nodes.close();
+            probabilities.close();
+            vectors.close();
+            sentences.close();
+            PrintStream header = new PrintStream(new FileOutputStream(prefix + ".json"), false, "utf-8");
+            StringBuilder columns = new StringBuilder();
+            for (String column : NODE_COLUMNS) {
+                columns.append(columns.length() == 0 ? "" : ", ").append('"').append(column).append('"');
+            }
+            header.println("{\"nodes\": " + nodeCount + ", \"sentences\": " + sentenceCount +
+                    ", \"classes\": " + classes + ", \"hidden\": " + hidden +
+                    ", \"node_columns\": [" + columns + "]}");
+            header.close();
+        }
+    }
+
+    /**
+     * Runs the pipeline on the text of one review and returns the
+     * predicted class (0-4) of each of its sentences.
+     */
+    static int[] classifySentences(StanfordCoreNLP pipeline, String reviewText) {
+        Annotation reviewAnnotation = new Annotation(reviewText);
+        // run all the selected Annotators on this text
+        pipeline.annotate(reviewAnnotation);
+        return sentenceClasses(reviewAnnotation);
+    }
+
+    /**
+     * Runs the TREES pipeline on the parse trees of one review, one per
+     * sentence, starting at trees[from], and returns the predicted class
+     * (0-4) of each sentence.  Only forward propagation is left to do.
+     */
+    static int[] classifyTrees(StanfordCoreNLP pipeline, String[] trees, int from) {
+        List<CoreMap> sentences = new ArrayList<>();
+        for (int i = from; i < trees.length; i++) {
+            if (trees[i].trim().isEmpty()) {
+                continue;
+            }
+            Tree tree = Tree.valueOf(trees[i]);
+            CoreMap sentence = new Annotation(Sentence.listToString(tree.yield()));
+            sentence.set(TreeCoreAnnotations.TreeAnnotation.class, tree);
+            sentences.add(sentence);
+        }
+        Annotation reviewAnnotation = new Annotation("");
+        reviewAnnotation.set(CoreAnnotations.SentencesAnnotation.class, sentences);
+        pipeline.annotate(reviewAnnotation);
+        return sentenceClasses(reviewAnnotation);
+    }
+
+    static int[] sentenceClasses(Annotation reviewAnnotation) {
+        List<CoreMap> sentences = reviewAnnotation.get(CoreAnnotations.SentencesAnnotation.class);
+        if (sentences == null) {
+            return new int[0];
+        }
+        int[] sentenceClasses = new int[sentences.size()];
+        for (int i = 0; i < sentences.size(); i++) {
+            Tree tree = sentences.get(i).get(SentimentCoreAnnotations.SentimentAnnotatedTree.class);
+            sentenceClasses[i] = RNNCoreAnnotations.getPredictedClass(tree);
+        }
+        return sentenceClasses;
+    }
+
+    /**
+     * Averages the sentence classes of a review on a -2..2 scale and maps
+     * the average to the review score: 1 negative, 2 neutral, 3 positive.
+     * A review without sentences averages to NaN and scores 3.
+     */
+    static int reviewScore(int[] sentenceClasses) {
+        int[] scoreVector = {0,0,0,0,0};
+        for (int sentenceClass : sentenceClasses) {
+            // increase review score vector
+            scoreVector[sentenceClass]++;
+        }
+        float sentenceCount = sentenceClasses.length;
+
+        // calculate the overall review score
+        float avgReviewScore = (scoreVector[0] * (-2) + scoreVector[1] * (-1) +
+                scoreVector[2] * (0) +
+                scoreVector[3] * (1)+ scoreVector[4] * (2)) / sentenceCount;
+
+        if (avgReviewScore <= -0.5f){
+            return 1;
+        } else if (avgReviewScore > -0.5f && avgReviewScore < 0.5f){
+            return 2;
+        } else {
+            return 3;
+        }
+    }
+
+    /**
+     * The server mode answer to one review: its score, a tab and the
+     * comma separated classes of its sentences.
+     */
+    static String formatResult(int[] sentenceClasses) {
+        StringBuilder result = new StringBuilder();
+        result.append(reviewScore(sentenceClasses)).append('\t');
+        for (int i = 0; i < sentenceClasses.length; i++) {
+            if (i > 0) {
+                result.append(',');
+            }
+            result.append(sentenceClasses[i]);
+        }
+        return result.toString();
+    }
+
+    /**
+     * Classifies the sentences of one review, as a task for OrderedTasks.
+     * The review is lines[textLine], or with trees the parse trees from
+     * lines[textLine] on.
+     */
+    static class ReviewTask implements Callable<int[]> {
+        private final StanfordCoreNLP pipeline;
+        private final String[] lines;
+        private final int textLine;
+        private final boolean trees;
+
+        ReviewTask(StanfordCoreNLP pipeline, String[] lines, int textLine, boolean trees) {
+            this.pipeline = pipeline;
+            this.lines = lines;
+            this.textLine = textLine;
+            this.trees = trees;
+        }
+
+        public int[] call() {
+            if (trees) {
+                return classifyTrees(pipeline, lines, textLine);
+            }
+            return classifySentences(pipeline, lines[textLine]);
+        }
+    }
+
+    /**
+     * Parses one review into its binarized sentence trees, one per line,
+     * as a task for OrderedTasks.
+     */
+    static class ParseTask implements Callable<String> {
+        private final StanfordCoreNLP pipeline;
+        private final String reviewText;
+
+        ParseTask(StanfordCoreNLP pipeline, String reviewText) {
+            this.pipeline = pipeline;
+            this.reviewText = reviewText;
+        }
+
+        public String call() {
+            Annotation reviewAnnotation = new Annotation(reviewText);
+            pipeline.annotate(reviewAnnotation);
+            StringBuilder trees = new StringBuilder();
+            List<CoreMap> sentences = reviewAnnotation.get(CoreAnnotations.SentencesAnnotation.class);
+            if (sentences != null) {
+                for (CoreMap sentence : sentences) {
+                    trees.append(sentence.get(TreeCoreAnnotations.BinarizedTreeAnnotation.class)).append('\n');
+                }
+            }
+            return trees.toString();
+        }
+    }
+
+    /**
+     * Runs tasks on a pool of threads, sharing one pipeline, and hands
+     * the results back in submission order.  At most twice as many tasks
+     * as threads are queued, so a large test set is never held in memory
+     * as tasks.
+     */
+    static class OrderedTasks<T> {
+        // marks the end of the input in the queue, which takes no nulls
+        private final Future<T> end = new FutureTask<T>(new Callable<T>() {
+            public T call() {
+                return null;
+            }
+        });
+
+        private final ExecutorService executor;
+        private final BlockingQueue<Future<T>> pending;
+
+        OrderedTasks(int threads) {
+            executor = Executors.newFixedThreadPool(threads);
+            pending = new ArrayBlockingQueue<Future<T>>(2 * threads + 1);
+        }
+
+        boolean isFull() {
+            return pending.remainingCapacity() <= 1;
+        }
+
+        /**
+         * Queues a task, waiting while the queue is full.
+         */
+        void submit(Callable<T> task) throws InterruptedException {
+            pending.put(executor.submit(task));
+        }
+
+        /**
+         * Tells next() that no more tasks follow.
+         */
+        void finish() throws InterruptedException {
+            pending.put(end);
+        }
+
+        /**
+         * Result of the oldest queued task, or null after finish().
+         * Throws an ExecutionException if the task failed.
+         */
+        T next() throws InterruptedException, ExecutionException {
+            Future<T> result = pending.take();
+            return (result == end) ? null : result.get();
+        }
+
+        boolean isEmpty() {
+            return pending.isEmpty();
+        }
+
+        void shutdown() {
+            executor.shutdownNow();
+        }
+    }
+
+    /**
+     * Classifies one review per input line until EOF, with the models
+     * loaded once.  Every line is answered with exactly one output line,
+     * flushed right away, so a client can pipeline its requests; a review
+     * that fails is answered with ERROR, a tab and the exception.  With
+     * several threads a reader thread queues the lines while this thread
+     * writes the answers, in input order.  With trees a line holds the
+     * parse trees of a review, separated by tabs.
+     */
+    static void serve(final StanfordCoreNLP pipeline, final BufferedReader reader, PrintStream out, int threads,
+                      final boolean trees) throws InterruptedException {
+        long start = System.nanoTime();
+        final OrderedTasks<int[]> classifier = new OrderedTasks<>(threads);
+        Thread readerThread = new Thread(new Runnable() {
+            public void run() {
+                try {
+                    for (String line; (line = reader.readLine()) != null; ) {
+                        String[] lines = trees ? line.split("\t") : new String[] {line};
+                        classifier.submit(new ReviewTask(pipeline, lines, 0, trees));
+                    }
+                } catch (IOException e) {
+                    System.err.println("Reading requests failed: " + e);
+                } catch (InterruptedException e) {
+                    return;
+                }
+                try {
+                    classifier.finish();
+                } catch (InterruptedException e) {
+                    // the writer is gone already
+                }
+            }
+        });
+        readerThread.setDaemon(true);
+        readerThread.start();
+
+        int reviews = 0;
+        while (true) {
+            String result;
+            try {
+                int[] sentenceClasses = classifier.next();
+                if (sentenceClasses == null) {
+                    break;
+                }
+                result = formatResult(sentenceClasses);
+            } catch (ExecutionException e) {
+                result = "ERROR\t" + e.getCause().toString().replace('\n', ' ').replace('\t', ' ');
+            }
+            reviews++;
+            out.println(result);
+            out.flush();
+        }
+        classifier.shutdown();
+        printStats(reviews, start);
+    }
+
+    /**
+     * Prints every review of a test file as its score line, its
+     * binarized sentence trees, one per line, and a blank line: the
+     * -input TREES format, so the file never needs parsing again.
+     * Chunks without review text are left out, as the classifier skips
+     * them too.
+     */
+    static void parseFile(StanfordCoreNLP pipeline, String[] chunks, PrintStream out, int threads)
+            throws InterruptedException {
+        long start = System.nanoTime();
+        OrderedTasks<String> parser = new OrderedTasks<>(threads);
+        ArrayDeque<String> scores = new ArrayDeque<>();
+        int reviews = 0;
+        int nextChunk = 0;
+        while (nextChunk < chunks.length || !scores.isEmpty()) {
+            if (nextChunk < chunks.length && !parser.isFull()) {
+                String[] lines = chunks[nextChunk++].trim().split("\\n");
+                if (lines.length < 2) {
+                    continue;
+                }
+                parser.submit(new ParseTask(pipeline, lines[1]));
+                scores.add(lines[0]);
+                continue;
+            }
+            String score = scores.poll();
+            try {
+                out.print(score + "\n" + parser.next() + "\n");
+                reviews++;
+            } catch (ExecutionException e) {
+                // a review that fails to parse fails to classify too
+                System.err.println("Parsing a review failed: " + e.getCause());
+            }
+        }
+        out.flush();
+        parser.shutdown();
+        printStats(reviews, start);
+    }
+
+    /**
+     * Peak heap usage of this JVM so far, summed over the heap memory
+     * pools, in megabytes.
+     */
+    static long peakHeapMegabytes() {
+        long peak = 0;
+        for (MemoryPoolMXBean pool : ManagementFactory.getMemoryPoolMXBeans()) {
+            if (pool.getType() == MemoryType.HEAP) {
+                peak += pool.getPeakUsage().getUsed();
+            }
+        }
+        return peak >> 20;
+    }
+
+    /**
+     * Prints the throughput since start and the peak heap usage to
+     * stderr, as one line starting with STATS, for benchmarks.
+     */
+    static void printStats(int reviews, long start) {
+        double seconds = (System.nanoTime() - start) / 1e9;
+        System.err.println("STATS\treviews=" + reviews + "\tseconds=" + NF.format(seconds) +
+                "\treviews_per_second=" + NF.format(reviews / Math.max(seconds, 1e-9)) +
+                "\tpeak_heap_mb=" + peakHeapMegabytes());
+    }
+
     static final String DEFAULT_TLPP_CLASS = "edu.stanford.nlp.parser.lexparser.EnglishTreebankParserParams";
 
+    // the sentiment annotator only needs the binarized parse trees, the
+    // full pipeline also runs ner and dcoref, which cost most of the time
+    // and the memory
+    static final String MINIMAL_ANNOTATORS = "tokenize, ssplit, parse, sentiment";
+    static final String FULL_ANNOTATORS = "tokenize, ssplit, pos, lemma, ner, parse, dcoref, sentiment";
+
+    static String annotatorsFor(String mode) {
+        if (mode.equalsIgnoreCase("minimal")) {
+            return MINIMAL_ANNOTATORS;
+        } else if (mode.equalsIgnoreCase("full")) {
+            return FULL_ANNOTATORS;
+        }
+        return mode;
+    }
+
     public static void help() {
         System.err.println("Known command line arguments:");
         System.err.println("  -sentimentModel <model>: Which model to use");
         System.err.println("  -parserModel <model>: Which parser to use");
         System.err.println("  -file <filename>: Which file to process");
         System.err.println("  -stdin: Process stdin instead of a file");
-        System.err.println("  -input <format>: Which format to input, TEXT or TREES.  Will not process stdin as trees.  If trees are not already binarized, they will be binarized with -tlppClass's headfinder, which means they must have labels in that treebank's tagset.");
+        System.err.println("  -server: Classify one review per stdin line, answering '<score>\\t<sentence classes>' per line");
+        System.err.println("  -threads <n>: Classify n reviews of -file or -server in parallel, keeping the output in input order");
+        System.err.println("  -annotators <mode>: minimal (" + MINIMAL_ANNOTATORS + ") or full (" + FULL_ANNOTATORS + "), the default.  Any other value is used as the annotator list");
+        System.err.println("  -parseOnly: Print the reviews of -file as score and binarized parse trees, the -input TREES format of -file and -server");
+        System.err.println("  -input <format>: Which format to input, TEXT or TREES.  Will not process stdin as trees.  -server reads the trees of a review tab separated on one line.  If trees are not already binarized, they will be binarized with -tlppClass's headfinder, which means they must have labels in that treebank's tagset.");
         System.err.println("  -output <format>: Which format to output, PENNTREES, VECTORS, PROBABILITIES, or ROOT.  Multiple formats can be specified as a comma separated list.");
+        System.err.println("  -binaryOutput <prefix>: Write the -stdin trees to prefix.nodes (int32), prefix.probabilities and prefix.vectors (float32) and prefix.json instead of printing them");
         System.err.println("  -filterUnknown: remove unknown trees from the input.  Only applies to TREES input, in which case the trees must be binarized with sentiment labels");
         System.err.println("  -tlppClass: a class to use for building the binarizer if using non-binarized TREES as input.  Defaults to " + DEFAULT_TLPP_CLASS);
     }
@@ -233,12 +709,13 @@ public class LEGOClassifier {
         }
     }
 
-    public static void main(String[] args) throws IOException {
+    public static void main(String[] args) throws IOException, InterruptedException {
         String parserModel = null;
         String sentimentModel = null;
 
         String filename = null;
         boolean stdin = false;
+        boolean server = false;
 
         float successfulHits = 0;
         float totalReviews = 0;
@@ -249,6 +726,10 @@ public class LEGOClassifier {
         Input inputFormat = Input.TEXT;
 
         String tlppClass = DEFAULT_TLPP_CLASS;
+        String annotators = FULL_ANNOTATORS;
+        int threads = 1;
+        boolean parseOnly = false;
+        String binaryOutput = null;
 
         for (int argIndex = 0; argIndex < args.length; ) {
             if (args[argIndex].equalsIgnoreCase("-sentimentModel")) {
@@ -263,6 +744,9 @@ public class LEGOClassifier {
             } else if (args[argIndex].equalsIgnoreCase("-stdin")) {
                 stdin = true;
                 argIndex++;
+            } else if (args[argIndex].equalsIgnoreCase("-server")) {
+                server = true;
+                argIndex++;
             } else if (args[argIndex].equalsIgnoreCase("-input")) {
                 inputFormat = Input.valueOf(args[argIndex + 1].toUpperCase());
                 argIndex += 2;
@@ -276,6 +760,18 @@ public class LEGOClassifier {
             } else if (args[argIndex].equalsIgnoreCase("-filterUnknown")) {
                 filterUnknown = true;
                 argIndex++;
+            } else if (args[argIndex].equalsIgnoreCase("-binaryOutput")) {
+                binaryOutput = args[argIndex + 1];
+                argIndex += 2;
+            } else if (args[argIndex].equalsIgnoreCase("-parseOnly")) {
+                parseOnly = true;
+                argIndex++;
+            } else if (args[argIndex].equalsIgnoreCase("-threads")) {
+                threads = Integer.parseInt(args[argIndex + 1]);
+                argIndex += 2;
+            } else if (args[argIndex].equalsIgnoreCase("-annotators")) {
+                annotators = annotatorsFor(args[argIndex + 1]);
+                argIndex += 2;
             } else if (args[argIndex].equalsIgnoreCase("-tlppClass")) {
                 tlppClass = args[argIndex + 1];
                 argIndex += 2;
@@ -289,54 +785,57 @@ public class LEGOClassifier {
             }
         }
 
-        // We construct two pipelines.  One handles tokenization, if
-        // necessary.  The other takes tokenized sentences and converts
-        // them to sentiment trees.
-        Properties pipelineProps = new Properties();
-        Properties tokenizerProps = null;
-        if (sentimentModel != null) {
-            pipelineProps.setProperty("sentiment.model", sentimentModel);
-        }
-        if (parserModel != null) {
-            pipelineProps.setProperty("parse.model", parserModel);
-        }
-        if (inputFormat == Input.TREES) {
-            pipelineProps.setProperty("annotators", "binarizer, sentiment");
-            pipelineProps.setProperty("customAnnotatorClass.binarizer", "edu.stanford.nlp.pipeline.BinarizerAnnotator");
-            pipelineProps.setProperty("binarizer.tlppClass", tlppClass);
-            pipelineProps.setProperty("enforceRequirements", "false");
-        } else {
-            pipelineProps.setProperty("annotators", "parse, sentiment");
-            pipelineProps.setProperty("enforceRequirements", "false");
-            tokenizerProps = new Properties();
-            tokenizerProps.setProperty("annotators", "tokenize, ssplit");
-        }
-
-        if (stdin && tokenizerProps != null) {
-            tokenizerProps.setProperty("ssplit.eolonly", "true");
-        }
-
         int count = 0;
         if (filename != null) count++;
         if (stdin) count++;
+        if (server) count++;
         if (count > 1) {
-            throw new IllegalArgumentException("Please only specify one of -file, or -stdin");
+            throw new IllegalArgumentException("Please only specify one of -file, -stdin or -server");
         }
         if (count == 0) {
-            throw new IllegalArgumentException("Please specify either -file, or -stdin");
+            throw new IllegalArgumentException("Please specify either -file, -stdin or -server");
         }
 
-        StanfordCoreNLP tokenizer = (tokenizerProps == null) ? null : new StanfordCoreNLP(tokenizerProps);
+        // stdin lines are split into sentences by a separate tokenizer,
+        // one sentence per line
+        StanfordCoreNLP tokenizer = null;
+        if (stdin) {
+            Properties tokenizerProps = new Properties();
+            tokenizerProps.setProperty("annotators", "tokenize, ssplit");
+            tokenizerProps.setProperty("ssplit.eolonly", "true");
+            tokenizer = new StanfordCoreNLP(tokenizerProps);
+        }
 
         // Add in sentiment
         Properties props = new Properties();
-        props.put("annotators", "tokenize, ssplit, pos, lemma, ner, parse, dcoref, sentiment");
+        props.put("annotators", annotators);
         if (sentimentModel != null) {
             props.setProperty("sentiment.model", sentimentModel);
         }
+        if (parserModel != null) {
+            props.setProperty("parse.model", parserModel);
+        }
+        if (parseOnly) {
+            // the trees the parse annotator hands to sentiment, without it
+            props.setProperty("annotators", "tokenize, ssplit, parse");
+            props.setProperty("parse.binaryTrees", "true");
+        } else if (inputFormat == Input.TREES) {
+            // parsed already, only binarize trees which are not yet and run sentiment
+            props.setProperty("annotators", "binarizer, sentiment");
+            props.setProperty("customAnnotatorClass.binarizer", "edu.stanford.nlp.pipeline.BinarizerAnnotator");
+            props.setProperty("binarizer.tlppClass", tlppClass);
+            props.setProperty("enforceRequirements", "false");
+        }
 
         StanfordCoreNLP pipeline = new StanfordCoreNLP(props);
 
+        if (server) {
+            // only answers go to stdout, CoreNLP logs to stderr
+            PrintStream out = new PrintStream(new FileOutputStream(FileDescriptor.out), false, "utf-8");
+            serve(pipeline, IOUtils.readerFromStdin("utf-8"), out, threads, inputFormat == Input.TREES);
+            return;
+        }
+
         if (filename != null) {
             // Process a file.  The pipeline will do tokenization, which
             // means it will split it into sentences as best as possible
@@ -346,53 +845,48 @@ public class LEGOClassifier {
             // review score and the review (with multiple scentences)
             String text = IOUtils.slurpFileNoExceptions(filename);
             String[] chunks = text.split("\\n\\s*\\n+"); // need blank line to make a new chunk
+            if (parseOnly) {
+                parseFile(pipeline, chunks, new PrintStream(new FileOutputStream(FileDescriptor.out), false, "utf-8"), threads);
+                return;
+            }
+            long start = System.nanoTime();
+            // with TREES input every chunk is a score and the parse trees of its sentences
+            boolean trees = inputFormat == Input.TREES;
+
+            // reviews are classified on the thread pool, the hits are
+            // counted and printed here, in file order
+            OrderedTasks<int[]> classifier = new OrderedTasks<>(threads);
+            ArrayDeque<String[]> queued = new ArrayDeque<>();
+            int nextChunk = 0;
+            while (nextChunk < chunks.length || !queued.isEmpty()) {
+                if (nextChunk < chunks.length && !classifier.isFull()) {
+                    String chunk = chunks[nextChunk++];
+                    if (chunk.trim().isEmpty()) {
+                        continue;
+                    }
+
+                    // The expected format is that line 0 will be the text of the
+                    // sentence, and each subsequence line, if any, will be a value
+                    // followed by the sequence of tokens that get that value.
 
-            for (String chunk : chunks) {
-                if (chunk.trim().isEmpty()) {
+                    // Here we take the first line and tokenize it as one sentence.
+                    String[] lines = chunk.trim().split("\\n");
+                    // a malformed score stops the run before the review is queued
+                    Integer.parseInt(lines[0]);
+                    classifier.submit(new ReviewTask(pipeline, lines, 1, trees));
+                    queued.add(lines);
                     continue;
                 }
 
-                // The expected format is that line 0 will be the text of the
-                // sentence, and each subsequence line, if any, will be a value
-                // followed by the sequence of tokens that get that value.
-
-                // Here we take the first line and tokenize it as one sentence.
-                String[] lines = chunk.trim().split("\\n");
-
+                String[] lines = queued.poll();
                 int reviewScore = Integer.parseInt(lines[0]);
                 try {
-                    String reviewText = lines[1];
-
-                    Annotation reviewAnnotation = new Annotation(reviewText);
-                    // run all the selected Annotators on this text
-                    pipeline.annotate(reviewAnnotation);
-                    int computedReviewScore = 0;
-                    int[] scoreVector = {0,0,0,0,0};
-                    float sentenceCount = 0;
-
-                    List<CoreMap> sentences = reviewAnnotation.get(CoreAnnotations.SentencesAnnotation.class);
-                    if (sentences != null && ! sentences.isEmpty()) {
-                        for (int i = 0; i<sentences.size(); i++){
-                            Tree tree = sentences.get(i).get(SentimentCoreAnnotations.SentimentAnnotatedTree.class);
-                            int score = RNNCoreAnnotations.getPredictedClass(tree);
-                            // increase review score vector
-                            scoreVector[score]++;
-                            sentenceCount++;
-                        }
-                    }
+                    // taken first, so a failed review never leaves its result queued
+                    int[] sentenceClasses = classifier.next();
+                    // a review without sentences has no tree lines
+                    String reviewText = (lines.length > 1) ? lines[1] : "";
 
-                    // calculate the overall review score
-                    float avgReviewScore = (scoreVector[0] * (-2) + scoreVector[1] * (-1) +
-                            scoreVector[2] * (0) +
-                            scoreVector[3] * (1)+ scoreVector[4] * (2)) / sentenceCount;
-
-                    if (avgReviewScore <= -0.5f){
-                        computedReviewScore = 1;
-                    } else if (avgReviewScore > -0.5f && avgReviewScore < 0.5f){
-                        computedReviewScore = 2;
-                    } else {
-                        computedReviewScore = 3;
-                    }
+                    int computedReviewScore = reviewScore(sentenceClasses);
 
                     if (computedReviewScore == reviewScore){
                         successfulHits += 1;
@@ -402,19 +896,24 @@ public class LEGOClassifier {
                     totalReviews += 1;
                     System.out.println("Review nr: " + totalReviews);
                     System.out.println(reviewText);
-                }catch (Exception e){
+                } catch (ExecutionException e) {
+                    System.out.println(e.getCause().toString());
+                } catch (Exception e){
                     System.out.println(e.toString());
                 }
 
                 System.out.println((float) successfulHits / totalReviews);
                 System.out.println();
             }
+            classifier.shutdown();
+            printStats((int) totalReviews, start);
         } else {
             // Process stdin.  Each line will be treated as a single sentence.
             System.err.println("Reading in text from stdin.");
             System.err.println("Please enter one sentence per line.");
             System.err.println("Processing will end when EOF is reached.");
             BufferedReader reader = IOUtils.readerFromStdin("utf-8");
+            BinaryTreeWriter binaryWriter = (binaryOutput == null) ? null : new BinaryTreeWriter(binaryOutput);
 
             for (String line; (line = reader.readLine()) != null; ) {
                 line = line.trim();
@@ -422,14 +921,21 @@ public class LEGOClassifier {
                     Annotation annotation = tokenizer.process(line);
                     pipeline.annotate(annotation);
                     for (CoreMap sentence : annotation.get(CoreAnnotations.SentencesAnnotation.class)) {
-                        outputTree(System.out, sentence, outputFormats);
+                        if (binaryWriter != null) {
+                            binaryWriter.write(sentence);
+                        } else {
+                            outputTree(System.out, sentence, outputFormats);
+                        }
                     }
-                } else {
+                } else if (binaryWriter == null) {
                     // Output blank lines for blank lines so the tool can be
                     // used for line-by-line text processing
                     System.out.println("");
                 }
             }
+            if (binaryWriter != null) {
+                binaryWriter.close();
+            }
 
         }
     }
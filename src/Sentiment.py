@@ -2,24 +2,25 @@ from __future__ import division
 import csv
 import sys
 import argparse
-import json
-import nltk
-nltk.download('punkt')
-from nltk.tokenize import sent_tokenize
-
-from uclassify import uclassify
-from sklearn.cross_validation import KFold
-import ast
-import pycurl
 import numpy as np
 import re
-from io import BytesIO
 import urllib
 from warnings import warn
 import subprocess
 import os
 import string
 import random
+import shutil
+import glob
+import time
+from multiprocessing import cpu_count
+from corpus import CorpusStore
+from folds import kfold_bounds, fold_splits, run_folds
+import sentences
+from sentences import SentenceSplitter
+from corenlp import ANNOTATORS, CORENLP_HOME, CoreNLPWorker, parse_test_set, read_tree_set, tree_request
+from results import ResultWriter, open_results, completed_rows, classification_record, sentiment_record, \
+    migrate_classified_set, migrate_sentiments
 
 
 def id_generator(size=6, chars=string.ascii_uppercase + string.digits):
@@ -38,214 +39,479 @@ class cd:
         os.chdir(self.savedPath)
 
 
+def corenlp_score(rating):
+    # transform to coreNLP scale
+    if rating == -1:
+        return 1
+    elif rating == 0:
+        return 2
+    return 3
+
+
+CORENLP_DIR = '../tmp/corenlp/'
+# bytes buffered per output file; every chunk of rows is also joined into a single write per file
+WRITE_BUFFER = 1 << 20
+# fold models trained with SentimentTraining, relative to the corenlp directory
+CORENLP_MODEL = 'models/sentiment_model_%d.ser.gz'
+CORENLP_SCORES = np.array([1, 2, 3])
+
+
+def fold_checkpoints(k, model=CORENLP_MODEL, corenlp_home=CORENLP_HOME):
+    """Final model and intermediate training checkpoints of fold k, relative to the corenlp directory"""
+    final = model % k
+    stem = final[:-len('.ser.gz')]
+    checkpoints = sorted(os.path.relpath(path, corenlp_home)
+                         for path in glob.glob(os.path.join(corenlp_home, stem + '-*.ser.gz')))
+    if os.path.isfile(os.path.join(corenlp_home, final)):
+        checkpoints.insert(0, final)
+    return checkpoints
+
+
+def read_test_set(path):
+    """(score, text) of every block of a CoreNLP test file, split the way LEGOClassifier splits it"""
+    with open(path, 'r') as f:
+        content = f.read()
+    for chunk in re.split(r"\n\s*\n+", content):
+        lines = chunk.strip().split("\n")
+        if len(lines) < 2:
+            # blank, or a score without text, which LEGOClassifier skips too
+            continue
+        yield int(lines[0]), lines[1]
+
+
 class SentimentV2Classifier:
-    def __init__(self, senftimentV2_data = None):
+    def __init__(self, senftimentV2_data = None, n_folds = 3, stratified = False, workers = None):
+        # CorpusStore of the sanitized posts
         self.sentimentV2_data = senftimentV2_data
+        self.n_folds = n_folds
+        # stratified folds keep the rating proportions of the corpus in every fold
+        self.stratified = stratified
+        # processes splitting sentences, one per CPU by default
+        self.workers = workers
 
     def run_classifier(self):
         print("Run V2 classifier")
-        #for i in range(self.sentimentV2_data[:, ].shape[0]):
-        file_name_suffix = 0
-        # 3-fold validation
-        kf = KFold(len(self.sentimentV2_data), n_folds=3)
-        for train_index, test_index in kf:
-            # write to file
-            f1 = open('../tmp/corenlp/train_set' + str(file_name_suffix) + '.txt', 'w+')
-            f2 = open('../tmp/corenlp/test_set' + str(file_name_suffix) + '.txt', 'w+')
-            X_train, X_test = self.sentimentV2_data[train_index], self.sentimentV2_data[test_index]
-
-            f1.write("\n")
-            f2.write("\n")
-
-            for i in range(X_train[:, ].shape[0]):
-                score = 0
-                # transform to coreNLP scale
-                if X_train[i, 0] == '-1':
-                    score = 1
-                elif X_train[i, 0] == '0':
-                    score = 2
-                else:
-                    score = 3
-                sent_tokenize_list = sent_tokenize(X_train[i, 1].decode('utf-8'))
-                for j in range(len(sent_tokenize_list)):
-                    f1.write(str(score) + "\t" + str(sent_tokenize_list[j].encode('utf-8')) + "\n")
-                    f1.write("\n")
-            for i in range(X_test[:, ].shape[0]):
-                score = 0
-                # transform to coreNLP scale
-                if X_test[i, 0] == '-1':
-                    score = 1
-                elif X_test[i, 0] == '0':
-                    score = 2
-                else:
-                    score = 3
+        corpus = self.sentimentV2_data
+        labels = corpus.ratings if self.stratified else None
+        splits = fold_splits(len(corpus), self.n_folds, labels)
+
+        # every fold writes its test file and, to a part file, the train blocks of its rows
+        parts = [CORENLP_DIR + 'train_part' + str(k) + '.tmp' for k in range(self.n_folds)]
+        splitter = SentenceSplitter(self.workers)
+        try:
+            for k, (_, test_index) in enumerate(splits):
+                rows = ((corenlp_score(rating), text) for rating, text in corpus.iter_records(test_index))
+                with open(CORENLP_DIR + 'test_set' + str(k) + '.txt', 'w+', WRITE_BUFFER) as test_file, \
+                        open(parts[k], 'w+', WRITE_BUFFER) as part_file:
+                    test_file.write("\n")
+                    for blocks in splitter.blocks(rows):
+                        test_file.write(''.join(test_block for test_block, _ in blocks))
+                        part_file.write(''.join(train_block for _, train_block in blocks))
+        finally:
+            splitter.close()
+
+        # the train file of a fold is the train blocks of every other fold, in fold order
+        for k in range(self.n_folds):
+            with open(CORENLP_DIR + 'train_set' + str(k) + '.txt', 'w+', WRITE_BUFFER) as train_file:
+                train_file.write("\n")
+                for j in range(self.n_folds):
+                    if j != k:
+                        with open(parts[j], 'r') as part_file:
+                            shutil.copyfileobj(part_file, train_file, WRITE_BUFFER)
+        for part in parts:
+            os.remove(part)
+
+    def evaluate_classifier(self, model=CORENLP_MODEL, heap='4g', annotators='full', threads=1, cached_trees=False):
+        """
+        Classifies the test set of every fold with its model in a CoreNLP worker and prints the metrics.
+        With cached_trees the test sets are parsed once and later evaluations only run the sentiment model.
+        """
+        all_gold = []
+        all_predicted = []
+        for k in range(self.n_folds):
+            rows = self.test_rows(k, heap, threads, cached_trees)
+            gold, predicted = self.classify_rows(rows, model % k, heap, annotators, threads, cached_trees)
+            print("Fold " + str(k))
+            print_metrics(classification_metrics(gold, predicted, CORENLP_SCORES))
+            all_gold.append(gold)
+            all_predicted.append(predicted)
+
+        print("All folds")
+        print_metrics(classification_metrics(np.concatenate(all_gold), np.concatenate(all_predicted), CORENLP_SCORES))
+
+    def test_rows(self, k, heap='4g', threads=1, cached_trees=False):
+        """(score, worker request) of every review of the test set of fold k"""
+        test_set = CORENLP_DIR + 'test_set' + str(k) + '.txt'
+        if cached_trees:
+            return [(score, tree_request(trees))
+                    for score, trees in read_tree_set(parse_test_set(test_set, heap=heap, threads=threads))]
+        return list(read_test_set(test_set))
+
+    def classify_rows(self, rows, model, heap='4g', annotators='full', threads=1, cached_trees=False):
+        """Gold and predicted scores of the rows a worker with model classified, failed reviews left out"""
+        extra_args = ['-input', 'TREES'] if cached_trees else []
+        with CoreNLPWorker(model, heap, annotators, threads, extra_args) as worker:
+            results = worker.classify_many(text for _, text in rows)
+        scored = [(score, result[0]) for (score, _), result in zip(rows, results) if result[0] is not None]
+        gold = np.array([score for score, _ in scored], dtype=np.int8)
+        predicted = np.array([predicted for _, predicted in scored], dtype=np.int8)
+        return gold, predicted
+
+    def sweep_checkpoints(self, model=CORENLP_MODEL, heap='1g', workers=None, parse_heap='4g', parse_workers=1):
+        """
+        Evaluates the final model and every training checkpoint of every fold on the fold's test set and
+        prints one table ranked by accuracy. The test sets are parsed once into the tree cache, so each
+        model only loads itself and runs forward propagation; workers models are evaluated at a time.
+        The parser needs a larger heap than a sentiment model, so parse_workers test sets with parse_heap
+        each are parsed at a time.
+        """
+        workers = workers or cpu_count()
+        rows = run_folds(lambda k: self.test_rows(k, parse_heap, 1, True), range(self.n_folds), parse_workers)
+        tasks = [(k, checkpoint) for k in range(self.n_folds) for checkpoint in fold_checkpoints(k, model)]
+        if not tasks:
+            print("No models found")
+            return
+
+        def evaluate(task):
+            k, checkpoint = task
+            start = time.time()
+            gold, predicted = self.classify_rows(rows[k], checkpoint, heap, cached_trees=True)
+            return classification_metrics(gold, predicted, CORENLP_SCORES)['accuracy'], time.time() - start
+
+        results = run_folds(evaluate, tasks, workers)
+        ranked = sorted(zip(tasks, results), key=lambda result: -result[1][0])
+        print("%4s %4s %-48s %10s %10s" % ("rank", "fold", "model", "accuracy", "seconds"))
+        for rank, ((k, checkpoint), (accuracy, seconds)) in enumerate(ranked, 1):
+            print("%4d %4d %-48s %10.4f %10.2f" % (rank, k, checkpoint, accuracy, seconds))
+
+    def run_classifier_streaming(self, records, n_records):
+        print("Run V2 classifier (streaming)")
+        self.write_fold_files(records, n_records, self.n_folds)
+
+    def write_fold_files(self, records, n_records, n_folds=3):
+        # Single pass over the records: every row goes to the test file of its own fold and to the
+        # train files of all the other folds, so only one chunk of records is held in memory at a time.
+        bounds = kfold_bounds(n_records, n_folds)
+        train_files = [open(CORENLP_DIR + 'train_set' + str(k) + '.txt', 'w+', WRITE_BUFFER) for k in range(n_folds)]
+        test_files = [open(CORENLP_DIR + 'test_set' + str(k) + '.txt', 'w+', WRITE_BUFFER) for k in range(n_folds)]
+        for f in train_files + test_files:
+            f.write("\n")
+
+        splitter = SentenceSplitter(self.workers)
+        try:
+            rows = ((corenlp_score(rating), text) for rating, text in records)
+            i = 0
+            fold = 0
+            for blocks in splitter.blocks(rows):
+                test_out = [[] for _ in range(n_folds)]
+                train_out = [[] for _ in range(n_folds)]
+                for test_block, train_block in blocks:
+                    while i >= bounds[fold][1]:
+                        fold += 1
+                    test_out[fold].append(test_block)
+                    for k in range(n_folds):
+                        if k != fold:
+                            train_out[k].append(train_block)
+                    i += 1
+                for k in range(n_folds):
+                    test_files[k].write(''.join(test_out[k]))
+                    train_files[k].write(''.join(train_out[k]))
+        finally:
+            splitter.close()
+
+        for f in train_files + test_files:
+            f.close()
+
+
+
+RESPONSE_CACHE_FILE = '../tmp/response_cache.sqlite'
+SENTIMENT_LABELS = np.array([-1, 0, 1])
+CLASS_NAME_LABELS = {"neg": -1, "neutral": 0, "pos": 1}
 
-                f2.write(str(score) + "\n")
-                f2.write(str(X_test[i, 1] + "\n"))
-                f2.write("\n")
 
-            file_name_suffix += 1
-            f1.close()
-            f2.close()
+def classification_metrics(gold, predicted, labels=SENTIMENT_LABELS):
+    """Accuracy, per-class precision/recall and the confusion matrix (rows: gold, columns: predicted)"""
+    n_labels = len(labels)
+    gold_index = np.searchsorted(labels, gold)
+    predicted_index = np.searchsorted(labels, predicted)
+    confusion = np.bincount(gold_index * n_labels + predicted_index,
+                            minlength=n_labels * n_labels).reshape(n_labels, n_labels)
+    hits = np.diag(confusion)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = hits / confusion.sum(axis=0)
+        recall = hits / confusion.sum(axis=1)
+    return {
+        'accuracy': hits.sum() / max(confusion.sum(), 1),
+        'precision': precision,
+        'recall': recall,
+        'confusion': confusion,
+        'labels': labels,
+    }
 
 
+def print_metrics(metrics):
+    print("accuracy: %.4f" % metrics['accuracy'])
+    print("%8s %10s %10s" % ("class", "precision", "recall"))
+    for label, precision, recall in zip(metrics['labels'], metrics['precision'], metrics['recall']):
+        print("%8d %10.4f %10.4f" % (label, precision, recall))
+    print("confusion (rows: gold, columns: predicted):")
+    print(metrics['confusion'])
+
 
 class SentimentV1Classifier:
-    def __init__(self, senftimentV1_data = None):
+    def __init__(self, senftimentV1_data = None, offline = False, n_folds = 3, stratified = False, workers = None,
+                 chunk_size = 2000):
+        # CorpusStore of the sanitized posts
         self.sentimentV1_data = senftimentV1_data
+        # test texts classified and written per call, so an interrupted fold keeps the chunks it finished
+        self.chunk_size = chunk_size
         self.classifier_name = id_generator(10)
-        self.classifier = uclassify()
-        self.classifier.setWriteApiKey("6jYmrGb25nVC")
-        self.classifier.setReadApiKey("lNin5wW4Mod5")
+        self.n_folds = n_folds
+        # stratified folds keep the rating proportions of the corpus in every fold
+        self.stratified = stratified
+        # folds trained and classified at the same time, one per fold by default
+        self.workers = workers
+        # offline runs use the local Naive Bayes engine and keep their results apart from the service's
+        self.offline = offline
+        # imported here, so that runs without V1 don't load requests and scipy
+        from uclassify import uclassify, ResponseCache, LocalUclassify
+        if offline:
+            self.classifier = LocalUclassify()
+            self.results_prefix = '../tmp/local_classified_set'
+        else:
+            self.classifier = uclassify()
+            self.classifier.setWriteApiKey("6jYmrGb25nVC")
+            self.classifier.setReadApiKey("lNin5wW4Mod5")
+            self.classifier.setCache(ResponseCache(RESPONSE_CACHE_FILE))
+            self.results_prefix = '../tmp/classified_set'
 
 
     def cross_validate_classification(self):
-
-        file_name = 0
-        #3-fold validation
-        kf = KFold(len(self.sentimentV1_data), n_folds=3)
-        for train_index, test_index in kf:
-            self.classifier.addClass(["pos", "neg", "neutral"], self.classifier_name)
-            X_train, X_test = self.sentimentV1_data[train_index], self.sentimentV1_data[test_index]
-            neg_train = []
-            neutral_train = []
-            pos_train = []
-            test = []
-            for i in range(X_train[:, ].shape[0]):
-                if X_train[i, 0] == '-1':
-                    neg_train.append(X_train[i, 1])
-                elif X_train[i, 0] == '0':
-                    neutral_train.append(X_train[i, 1])
-                else:
-                    pos_train.append(X_train[i, 1])
-
-            for j in range(X_test[:, ].shape[0]):
-                test.append(X_test[j, 1])
+        corpus = self.sentimentV1_data
+        labels = corpus.ratings if self.stratified else None
+        splits = fold_splits(len(corpus), self.n_folds, labels)
+        # folds mostly wait on the service, so they share the client from a thread pool
+        run_folds(self.classify_fold, [(k, train_index, test_index) for k, (train_index, test_index) in enumerate(splits)],
+                  self.workers)
+
+    def classify_fold(self, task):
+        """Trains and classifies one fold on a classifier of its own and writes its results file"""
+        fold, train_index, test_index = task
+        classifier_name = self.classifier_name + "_" + str(fold)
+        self.classifier.create(classifier_name)
+        try:
+            self.classifier.addClass(["pos", "neg", "neutral"], classifier_name)
+            corpus = self.sentimentV1_data
+            train_ratings = corpus.ratings[train_index]
+            neg_train = corpus.texts_at(train_index[train_ratings == -1])
+            neutral_train = corpus.texts_at(train_index[train_ratings == 0])
+            pos_train = corpus.texts_at(train_index[train_ratings == 1])
 
             # set train tests
             self.classifier.train(neg_train,
-                                  "neg", self.classifier_name)
+                                  "neg", classifier_name)
             self.classifier.train(neutral_train,
-                                  "neutral", self.classifier_name)
+                                  "neutral", classifier_name)
             self.classifier.train(pos_train,
-                                  "pos", self.classifier_name)
+                                  "pos", classifier_name)
+
+            # classify, writing one record per classified corpus row as soon as its chunk is done
+            with ResultWriter(self.results_prefix + str(fold) + '.jsonl', 'w') as writer:
+                for start in range(0, len(test_index), self.chunk_size):
+                    rows = test_index[start:start + self.chunk_size]
+                    output = self.classifier.classify(corpus.texts_at(rows), classifier_name)
+                    writer.write_all(classification_record(row, text_coverage, classes)
+                                     for row, (_, text_coverage, classes) in zip(rows, output))
+                    writer.sync()
+        finally:
+            self.classifier.removeClassifier(classifier_name)
+        return len(test_index)
+
+    def text_label_index(self):
+        """Maps every post text of the corpus to its row"""
+        corpus = self.sentimentV1_data
+        return dict((corpus.text(j), j) for j in range(len(corpus)))
 
-            # classify
-            output = self.classifier.classify(test, self.classifier_name)
+    def analyze_data_from_classifier(self):
+        corpus = self.sentimentV1_data
+        text_index = None
+        all_gold = []
+        all_predicted = []
+        for i in range(0, self.n_folds):
+            records = open_results(self.results_prefix + str(i) + '.jsonl',
+                                   self.results_prefix + str(i) + '.txt', migrate_classified_set)
+            rows = []
+            predicted = []
+            for record in records:
+                probabilities = record['p']
+                rating_value = CLASS_NAME_LABELS[max(probabilities, key=probabilities.get)]
+                if 'row' in record:
+                    row = record['row']
+                else:
+                    # results migrated from the old format carry the text instead of the row id
+                    if text_index is None:
+                        text_index = self.text_label_index()
+                    text = record['text'].encode('utf-8')
+                    row = text_index.get(text, -1)
+                    if row == -1:
+                        print ("error on text: " + text)
+                        continue
+                rows.append(row)
+                predicted.append(rating_value)
+
+            gold = corpus.ratings[np.array(rows, dtype=np.int64)]
+            predicted = np.array(predicted, dtype=np.int8)
+            print("Fold " + str(i))
+            print_metrics(classification_metrics(gold, predicted))
+            all_gold.append(gold)
+            all_predicted.append(predicted)
+
+        print("All folds")
+        print_metrics(classification_metrics(np.concatenate(all_gold), np.concatenate(all_predicted)))
 
-            # write to file
-            f1 = open('../tmp/classified_set' + str(file_name) + '.txt', 'w+')
-            f1.write(str(output))
 
-            file_name += 1
-            self.classifier.removeClass(["pos", "neg", "neutral"], self.classifier_name)
+    def run_classifier(self):
+        if self.offline:
+            # training the local engine takes seconds, so offline runs always redo the cross validation
+            self.cross_validate_classification()
+        #self.cross_validate_classification()
+        self.analyze_data_from_classifier()
 
-    def analyze_data_from_classifier(self):
-        #3-Fold
-        for i in range(0,3):
-            f = open('../tmp/classified_set' + str(i) + '.txt', 'r')
-            result_string = f.read()
-            f.close()
-            tuple_list = ast.literal_eval(result_string)
-            nr_successful_hits = 0
-            for iter, (text, _, [(_, neg_value),(_, neutral_value),(_, pos_value)]) in enumerate(tuple_list):
-                # iterate through the list
-                values = [float(neg_value),float(neutral_value),float(pos_value)]
-                index = values.index(max(values))
-                if index == 0:
-                    rating_value = -1
-                elif index == 1:
-                    rating_value = 0
-                else:
-                    rating_value = 1
-                found = False
-                for j in range(self.sentimentV1_data[:, ].shape[0]):
-                    if text == self.sentimentV1_data[j, 1]:
-                        found = True
-                        real_rating = int(self.sentimentV1_data[j, 0])
-                        if real_rating == rating_value:
-                            nr_successful_hits += 1
 
-                if not found:
-                    print ("error on text: " + text)
+def naive_bayes_predict(train, train_labels, test, labels=SENTIMENT_LABELS):
+    """
+    Labels of the test rows by multinomial Naive Bayes on count matrices, with equal class priors like
+    uClassify and Laplace smoothing over the features seen in training; unseen features are ignored.
+    """
+    counts = np.vstack([np.asarray(train[np.flatnonzero(train_labels == label)].sum(axis=0)).ravel()
+                        for label in labels])
+    seen = np.flatnonzero(counts.sum(axis=0) > 0)
+    counts = counts[:, seen]
+    log_prob = np.log(counts + 1.0) - np.log(counts.sum(axis=1, keepdims=True) + len(seen))
+    scores = np.asarray(test[:, seen].dot(log_prob.T))
+    return labels[scores.argmax(axis=1)]
 
-            print (nr_successful_hits/len(tuple_list))
 
+class HashedFeatureBaseline:
+    def __init__(self, data = None, n_folds = 3, stratified = False, workers = None):
+        # CorpusStore of the sanitized posts
+        self.data = data
+        self.n_folds = n_folds
+        # stratified folds keep the rating proportions of the corpus in every fold
+        self.stratified = stratified
+        # processes hashing the corpus, when it is not cached yet
+        self.workers = workers
 
     def run_classifier(self):
-        #self.classifier.create(self.classifier_name)
-        #self.cross_validate_classification()
-        #self.classifier.removeClassifier(self.classifier_name)
-        self.analyze_data_from_classifier()
+        """Cross validates Naive Bayes on the hashed unigram/bigram counts features.py caches for the corpus"""
+        # imported here, so that runs without the baseline don't load scipy
+        from features import cached_features
+        corpus = self.data
+        start = time.time()
+        matrix = cached_features(corpus, processes=self.workers)
+        print("%d texts x %d hashed n-grams, %d non-zero (%.1f s)" % (matrix.shape[0], matrix.shape[1], matrix.nnz,
+                                                                      time.time() - start))
+        ratings = np.asarray(corpus.ratings)
+        splits = fold_splits(len(corpus), self.n_folds, ratings if self.stratified else None)
+        all_gold = []
+        all_predicted = []
+        for k, (train_index, test_index) in enumerate(splits):
+            gold = ratings[test_index]
+            predicted = naive_bayes_predict(matrix[train_index], ratings[train_index], matrix[test_index])
+            print("Fold " + str(k))
+            print_metrics(classification_metrics(gold, predicted))
+            all_gold.append(gold)
+            all_predicted.append(predicted)
+
+        print("All folds")
+        print_metrics(classification_metrics(np.concatenate(all_gold), np.concatenate(all_predicted)))
+
+
+SENTIMENT_API_URL = 'http://text-processing.com/api/sentiment/'
 
 
 warn("Not used!")
 class DownloadSentiments:
-    def __init__(self, data = None):
+    def __init__(self, data = None, cache = None):
+        # CorpusStore of the sanitized posts
         self.data = data
-        self.results = []
-        self.downloaded_results = []
+        # ResponseCache consulted before hitting the webservice
+        self.cache = cache
+        self.downloaded_results = {}
         self.sentimentV1_data = []
         self.index_to_remove = []
 
 
-    def download_sentiments(self):
+    def download_sentiments(self, url=SENTIMENT_API_URL, concurrency=10, max_host_connections=4,
+                            sync_every=100, results_file='../tmp/results.jsonl'):
+        # Rows are checkpointed to results.jsonl as they finish. A restarted download skips the rows that
+        # already have a result and retries only the failed or missing ones.
         print("Download sentiment data from webservice")
-        f1 = open('../tmp/results.txt', 'w+')
-
-        for i in range(self.data[:, ].shape[0]):
-            print("Downloading entry " + str(i))
-            escaped = re.escape(self.data[i, 1])
-
-            post_data = {'text': escaped}
-
-            buffer = BytesIO()
-            c = pycurl.Curl()
-            c.setopt(c.URL, 'http://text-processing.com/api/sentiment/')
-            c.setopt(c.POSTFIELDS, urllib.urlencode(post_data))
-            c.setopt(c.WRITEDATA, buffer)
-            c.perform()
-            c.close()
-
-            body = buffer.getvalue()
-            # Body is a byte string.
-            # We have to know the encoding in order to print it to a text file
-            # such as standard output.
-            response = body.decode('utf-8')
-            self.results.append(response)
-
-        f1.write(str(self.results))
+        # imported here, so that only downloads load pycurl
+        from downloader import CurlMultiDownloader
+        done = completed_rows(results_file, len(self.data))
+        print(str(done.sum()) + " of " + str(len(self.data)) + " entries already downloaded")
+
+        with ResultWriter(results_file, 'a') as writer, \
+                CurlMultiDownloader(url, concurrency, max_host_connections) as downloader:
+            for n, (i, status, body, error) in enumerate(downloader.fetch(self._download_jobs(url, done, writer))):
+                print("Downloaded entry " + str(i))
+                if error is not None:
+                    writer.write({'row': i, 'error': error})
+                elif status != 200:
+                    writer.write({'row': i, 'error': 'HTTP ' + str(status)})
+                else:
+                    # Body is a byte string.
+                    # We have to know the encoding in order to print it to a text file
+                    # such as standard output.
+                    record = sentiment_record(i, body.decode('utf-8'))
+                    writer.write(record)
+                    if self.cache is not None and 'error' not in record:
+                        self.cache.put(self.cache.key(url, 'sentiment', self.data.text(i)), body)
+                if (n + 1) % sync_every == 0:
+                    writer.sync()
+                else:
+                    writer.flush()
+            writer.sync()
+
+    def _download_jobs(self, url, done, writer):
+        # rows whose text is in the response cache are written straight away instead of being downloaded
+        for i in np.flatnonzero(~done):
+            text = self.data.text(i)
+            if self.cache is not None:
+                body = self.cache.get(self.cache.key(url, 'sentiment', text))
+                if body is not None:
+                    writer.write(sentiment_record(i, body.decode('utf-8')))
+                    continue
+            yield int(i), urllib.urlencode({'text': re.escape(text)})
 
     def import_mined_json(self):
         print("Import json data")
-        f1 = open('../tmp/results.txt', 'r')
-        result_string = f1.read()
-        self.downloaded_results = ast.literal_eval(result_string)
-        f1.close()
+        for record in open_results('../tmp/results.jsonl', '../tmp/results.txt', migrate_sentiments):
+            self.downloaded_results[record['row']] = record
 
     def construct_arrays(self):
         print("Constructing arrays")
-        print(self.data.shape)
+        print(len(self.data))
         print(len(self.downloaded_results))
-        for i in range(self.data[:, ].shape[0]):
-            # using try-catch because some downloaded results don't have data associated because of some kind of form
+        for i in range(len(self.data)):
+            # some downloaded results don't have data associated because of some kind of form
             # error. (Form Validation Errors text: This field is required.)
-            try:
-                json_row = json.loads(self.downloaded_results[i])
-                if json_row['label'] == "pos":
-                    raw_value = 1
-                elif json_row['label'] == "neg":
-                    raw_value = -1
-                else:
-                    raw_value = 0
-
-                row = [self.data[i, 1], self.data[i, 0], raw_value]
-                self.sentimentV1_data.append(row)
-
-            except:
+            record = self.downloaded_results.get(i)
+            if record is None or 'error' in record:
                 # save the indices that we need to remove for the second sentiment mining
                 self.index_to_remove.append(i)
-                pass
+                continue
+
+            if record['label'] == "pos":
+                raw_value = 1
+            elif record['label'] == "neg":
+                raw_value = -1
+            else:
+                raw_value = 0
+
+            row = [self.data.text(i), self.data.ratings[i], raw_value]
+            self.sentimentV1_data.append(row)
 
         self.sentimentV1_data = np.array(self.sentimentV1_data)
         print(self.sentimentV1_data)
@@ -266,6 +532,31 @@ class CSVAnalyser:
         self.sanitized_data = []
         np.set_printoptions(threshold=np.nan)
 
+    def iter_records(self):
+        """Yields validated (rating, text) records one CSV row at a time"""
+        self.csvfile.seek(0)
+        csv_reader = csv.reader(self.csvfile, delimiter=',')
+        next(csv_reader, None)  # skip the headers
+        for row in csv_reader:
+            if len(row) < 4:
+                continue
+            rating = row[1]
+            if rating == '1' or rating == '-1' or rating == '0':
+                yield int(rating), row[3]
+
+    def count_records(self):
+        return sum(1 for _ in self.iter_records())
+
+    def write_store(self, path):
+        """Streams the validated records into a CorpusStore at path"""
+        return CorpusStore.write(path, self.iter_records(), getattr(self.csvfile, 'name', None))
+
+    def open_store(self, path):
+        """Opens the CorpusStore at path, (re)writing it only when the CSV changed since it was written"""
+        if CorpusStore.is_current(path, getattr(self.csvfile, 'name', None)):
+            return CorpusStore(path)
+        return self.write_store(path)
+
     def analyze(self):
         csv_reader = csv.reader(self.csvfile, delimiter=',')
         next(csv_reader, None)  # skip the headers
@@ -293,15 +584,65 @@ class CSVAnalyser:
 def main():
     parser = argparse.ArgumentParser(prog='CSVAnalyzer')
     parser.add_argument('csvfile', type=argparse.FileType('r'), help='CSV format <Stud|Rating|Link|Comment>')
+    parser.add_argument('--stream', action='store_true',
+                        help='stream validated records straight from the CSV instead of the corpus store')
+    parser.add_argument('--offline', action='store_true',
+                        help='run the uclassify experiment with the local Naive Bayes engine instead of CoreNLP')
+    parser.add_argument('--folds', type=int, default=3, help='number of cross validation folds')
+    parser.add_argument('--stratified', action='store_true',
+                        help='keep the rating proportions in every fold (not with --stream)')
+    parser.add_argument('--features', action='store_true',
+                        help='cross validate a Naive Bayes baseline on the cached hashed n-gram features of the corpus')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='folds classified at the same time (V1), sentence splitting processes (V2),'
+                             ' models evaluated at the same time (--sweep) or feature hashing processes (--features)')
+    parser.add_argument('--evaluate', action='store_true',
+                        help='classify the CoreNLP test sets with the fold models in a persistent CoreNLP worker')
+    parser.add_argument('--annotators', choices=ANNOTATORS, default='full',
+                        help='CoreNLP pipeline of --evaluate; minimal only tokenizes, splits, parses and scores')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='reviews the CoreNLP worker of --evaluate classifies in parallel')
+    parser.add_argument('--cached-trees', action='store_true',
+                        help='parse the test sets of --evaluate once and classify the cached parse trees')
+    parser.add_argument('--sweep', action='store_true',
+                        help='rank the final model and all training checkpoints of every fold by test set accuracy')
+    parser.add_argument('--punkt', default=None,
+                        help='Punkt english.pickle or nltk_data directory to load offline, instead of downloading it')
     args = parser.parse_args()
 
+    sentences.configure_punkt(args.punkt)
     csv_analyser = CSVAnalyser(args.csvfile)
-    data = csv_analyser.analyze()
+    if args.stream:
+        v2Classifier = SentimentV2Classifier(n_folds=args.folds, workers=args.workers)
+        v2Classifier.run_classifier_streaming(csv_analyser.iter_records(), csv_analyser.count_records())
+        return
+
+    if args.sweep:
+        SentimentV2Classifier(n_folds=args.folds).sweep_checkpoints(workers=args.workers)
+        return
+
+    if args.evaluate:
+        SentimentV2Classifier(n_folds=args.folds).evaluate_classifier(annotators=args.annotators,
+                                                                      threads=args.threads,
+                                                                      cached_trees=args.cached_trees)
+        return
+
+    data = csv_analyser.open_store('../tmp/corpus')
+
+    if args.features:
+        HashedFeatureBaseline(data, n_folds=args.folds, stratified=args.stratified, workers=args.workers).run_classifier()
+        return
+
+    if args.offline:
+        v1Classifier = SentimentV1Classifier(data, offline=True, n_folds=args.folds,
+                                             stratified=args.stratified, workers=args.workers)
+        v1Classifier.run_classifier()
+        return
 
     #v1Classifier = SentimentV1Classifier(data)
     #v1Classifier.run_classifier()
 
-    v2Classifier = SentimentV2Classifier(data)
+    v2Classifier = SentimentV2Classifier(data, n_folds=args.folds, stratified=args.stratified, workers=args.workers)
     v2Classifier.run_classifier()
 
 
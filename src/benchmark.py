@@ -0,0 +1,188 @@
+from __future__ import division
+import argparse
+import base64
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from corenlp import ANNOTATORS, CoreNLPWorker, parse_stats
+from Sentiment import CSVAnalyser, read_test_set
+from uclassify import uclassify, uclassify_xml
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_case(target, args, queue):
+    start = time.time()
+    result = target(*args)
+    queue.put((result, time.time() - start, peak_rss_mb()))
+
+
+def run_isolated(target, *args):
+    """Runs target in a fresh child process so every case gets its own peak RSS"""
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_case, args=(target, args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def ingest_array(csv_path):
+    with open(csv_path, 'r') as csvfile:
+        return len(CSVAnalyser(csvfile).analyze())
+
+
+def ingest_stream(csv_path):
+    with open(csv_path, 'r') as csvfile:
+        return sum(1 for _ in CSVAnalyser(csvfile).iter_records())
+
+
+def bench_ingestion(csv_path):
+    print("%-10s %10s %10s %14s" % ("mode", "records", "seconds", "peak RSS (MB)"))
+    for name, target in (("array", ingest_array), ("stream", ingest_stream)):
+        records, seconds, rss = run_isolated(target, csv_path)
+        print("%-10s %10d %10.2f %14.1f" % (name, records, seconds, rss))
+
+
+def build_train_minidom(texts):
+    # the DOM based request building that uclassify.train used before the streaming writer
+    client = uclassify()
+    doc, root_element = client._buildbasicXMLdoc()
+    textstag = doc.createElement("texts")
+    writecalls = doc.createElement("writeCalls")
+    writecalls.setAttribute("writeApiKey", "key")
+    writecalls.setAttribute("classifierName", "Bench")
+    root_element.appendChild(textstag)
+    root_element.appendChild(writecalls)
+    counter = 1
+    for text in texts:
+        textbase64 = doc.createElement("textBase64")
+        traintag = doc.createElement("train")
+        textbase64.setAttribute("id", "posText" + str(counter))
+        textbase64.appendChild(doc.createTextNode(base64.b64encode(text)))
+        textstag.appendChild(textbase64)
+        traintag.setAttribute("id", "Trainpos" + str(counter))
+        traintag.setAttribute("className", "pos")
+        traintag.setAttribute("textId", "posText" + str(counter))
+        counter = counter + 1
+        writecalls.appendChild(traintag)
+    return len(doc.toxml())
+
+
+def build_train_streaming(texts):
+    return len(uclassify_xml.build_train(b"train", "Train", "key", texts, "pos", "Bench"))
+
+
+def _build_request(builder, n_texts):
+    texts = [("post %d " % i) + "This set has a great build and nice minifigs. " * 10 for i in range(n_texts)]
+    return builder(texts)
+
+
+def bench_xml_build(sizes):
+    print("%-10s %8s %12s %10s %14s" % ("builder", "texts", "bytes", "seconds", "peak RSS (MB)"))
+    for n_texts in sizes:
+        for name, builder in (("minidom", build_train_minidom), ("streaming", build_train_streaming)):
+            size, seconds, rss = run_isolated(_build_request, builder, n_texts)
+            print("%-10s %8d %12d %10.2f %14.1f" % (name, n_texts, size, seconds, rss))
+
+
+# what the interpreter runs; "eager" imports everything Sentiment.py used to import up front,
+# without the network check of the nltk.download('punkt') call it also made
+STARTUP_CASES = (
+    ("import", ["-c", "import Sentiment"]),
+    ("--help", ["Sentiment.py", "--help"]),
+    ("eager", ["-c", "import nltk, sklearn.cross_validation, pycurl, uclassify, Sentiment"]),
+)
+
+
+def time_command(argv, repeat):
+    timings = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(repeat):
+            start = time.time()
+            subprocess.call([sys.executable] + argv, stdout=devnull, stderr=devnull)
+            timings.append(time.time() - start)
+    return sorted(timings)
+
+
+def bench_startup(repeat):
+    print("%-10s %10s %10s" % ("case", "best (s)", "median (s)"))
+    for name, argv in STARTUP_CASES:
+        timings = time_command(argv, repeat)
+        print("%-10s %10.3f %10.3f" % (name, timings[0], timings[len(timings) // 2]))
+
+
+def classify_test_set(rows, model, heap, annotators, threads=1):
+    """Accuracy, model load seconds, classification seconds and the worker's STATS of one worker run"""
+    with tempfile.TemporaryFile() as log:
+        start = time.time()
+        worker = CoreNLPWorker(model, heap, annotators, threads, stderr=log)
+        try:
+            # the first answer waits for the models to load
+            worker.classify(rows[0][1])
+            loaded = time.time()
+            results = worker.classify_many(text for _, text in rows)
+            seconds = time.time() - loaded
+        finally:
+            worker.close()
+        log.seek(0)
+        stats = parse_stats(log.read())
+    hits = sum(1 for (score, _), (predicted, _) in zip(rows, results) if predicted == score)
+    return hits / len(rows), loaded - start, seconds, stats
+
+
+def bench_corenlp(test_set, model, heap, modes, limit, thread_counts):
+    rows = list(read_test_set(test_set))[:limit]
+    print("%d reviews of %s" % (len(rows), test_set))
+    print("%-10s %8s %10s %10s %10s %12s %14s" % ("annotators", "threads", "accuracy", "load (s)", "seconds", "posts/s",
+                                                  "peak heap (MB)"))
+    for annotators in modes:
+        for threads in thread_counts:
+            accuracy, load, seconds, stats = classify_test_set(rows, model, heap, annotators, threads)
+            print("%-10s %8d %10.4f %10.2f %10.2f %12.2f %14d" % (annotators, threads, accuracy, load, seconds,
+                                                                len(rows) / seconds, stats.get('peak_heap_mb', -1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='benchmark')
+    subparsers = parser.add_subparsers(dest='command')
+
+    ingestion = subparsers.add_parser('ingestion', help='peak RSS of array vs streaming CSV ingestion')
+    ingestion.add_argument('csvfile', help='CSV format <Stud|Rating|Link|Comment>')
+
+    xml_build = subparsers.add_parser('xml', help='build time and peak RSS of uclassify train requests')
+    xml_build.add_argument('sizes', type=int, nargs='*', default=[1000, 10000, 100000])
+
+    startup = subparsers.add_parser('startup', help='interpreter start up time of Sentiment.py')
+    startup.add_argument('--repeat', type=int, default=5)
+
+    corenlp = subparsers.add_parser('corenlp', help='posts/s and peak heap of the LEGOClassifier annotator pipelines')
+    corenlp.add_argument('--test-set', default='../corenlp/test_sets/test_set0.txt')
+    corenlp.add_argument('--model', default='models/sentiment_model_0.ser.gz',
+                         help='sentiment model, relative to the corenlp directory')
+    corenlp.add_argument('--heap', default='4g')
+    corenlp.add_argument('--annotators', choices=ANNOTATORS, nargs='+', default=list(ANNOTATORS))
+    corenlp.add_argument('--threads', type=int, nargs='+', default=[1], help='LEGOClassifier -threads values to compare')
+    corenlp.add_argument('--limit', type=int, default=None, help='classify only the first reviews of the test set')
+
+    args = parser.parse_args()
+    if args.command == 'ingestion':
+        bench_ingestion(args.csvfile)
+    elif args.command == 'xml':
+        bench_xml_build(args.sizes)
+    elif args.command == 'startup':
+        bench_startup(args.repeat)
+    elif args.command == 'corenlp':
+        bench_corenlp(args.test_set, args.model, args.heap, args.annotators, args.limit, args.threads)
+
+
+if __name__ == "__main__":
+    main()
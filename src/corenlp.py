@@ -0,0 +1,147 @@
+import hashlib
+import os
+import re
+import subprocess
+import sys
+import threading
+
+# java is started in the corenlp directory, next to the CoreNLP jars and the compiled LEGOClassifier
+CORENLP_HOME = '../corenlp'
+CORENLP_CLASSPATH = '*:.'
+# LEGOClassifier -annotators modes; minimal leaves out pos, lemma, ner and dcoref, which sentiment does not use
+ANNOTATORS = ('full', 'minimal')
+# binarized parse trees of test sets, by test set content and parser model
+TREE_CACHE_DIR = '../tmp/trees'
+
+
+def _request(text):
+    if not isinstance(text, bytes):
+        text = text.encode('utf-8')
+    # one review per line
+    return b' '.join(text.splitlines()) + b'\n'
+
+
+def tree_request(trees):
+    """A review of a -input TREES worker: its sentence trees on one line, tab separated"""
+    return b'\t'.join(trees)
+
+
+def read_tree_set(path):
+    """(score, [binarized sentence trees]) of every review of a LEGOClassifier -parseOnly file"""
+    with open(path, 'rb') as f:
+        content = f.read()
+    for chunk in re.split(br"\n\s*\n+", content):
+        lines = chunk.strip().split(b"\n")
+        if not lines[0]:
+            continue
+        # a review without sentences is a score line alone
+        yield int(lines[0]), lines[1:]
+
+
+def _file_digest(path, parser_model):
+    digest = hashlib.sha1((parser_model or 'default').encode('utf-8'))
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_test_set(test_set, cache_dir=TREE_CACHE_DIR, heap='4g', threads=1, parser_model=None, java='java',
+                   classpath=CORENLP_CLASSPATH, cwd=CORENLP_HOME):
+    """
+    Path of the binarized parse trees of a test set. The trees only depend on the text and the parser, not
+    on the sentiment model, so the test set is parsed by LEGOClassifier -parseOnly once and every later
+    call, for any sentiment model, finds the trees in cache_dir.
+    """
+    path = os.path.join(cache_dir, _file_digest(test_set, parser_model) + '.trees')
+    if os.path.isfile(path):
+        return path
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    args = [java, '-mx' + heap, '-cp', classpath, 'LEGOClassifier', '-parseOnly',
+            '-file', os.path.abspath(test_set), '-threads', str(threads)]
+    if parser_model is not None:
+        args += ['-parserModel', parser_model]
+    # written under a temporary name first, so an interrupted parse never leaves a truncated cache entry
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as out:
+        subprocess.check_call(args, cwd=cwd, stdout=out)
+    os.rename(tmp_path, path)
+    return path
+
+
+def parse_stats(log):
+    """{name: value} of the last STATS line LEGOClassifier wrote to its stderr log, {} if there is none"""
+    stats = {}
+    for line in log.splitlines():
+        if line.startswith(b'STATS\t'):
+            stats = dict(field.decode('ascii').split('=', 1) for field in line.split(b'\t')[1:])
+    return dict((name, float(value)) for name, value in stats.items())
+
+
+def parse_result(line):
+    """(review score 1-3, [sentence classes 0-4]) of one server answer, (None, []) for a failed review"""
+    line = line.rstrip(b'\r\n')
+    score, _, classes = line.partition(b'\t')
+    if score == b'ERROR':
+        sys.stderr.write("CoreNLP failed on a review: %s\n" % classes.decode('utf-8', 'replace'))
+        return None, []
+    return int(score), [int(c) for c in classes.split(b',') if c]
+
+
+class CoreNLPWorker:
+    """
+    A long running LEGOClassifier -server process: the parser and sentiment models are loaded once and
+    reviews are streamed to it over a pipe, one line each. Requests are pipelined, a writer thread keeps
+    the JVM busy while answers are read, so throughput is bound by CoreNLP and not by round trips.
+    """
+    def __init__(self, sentiment_model, heap='4g', annotators='full', threads=1, extra_args=(), java='java',
+                 classpath=CORENLP_CLASSPATH, cwd=CORENLP_HOME, stderr=None):
+        # with threads > 1 the JVM classifies that many pipelined reviews at once, answers stay in order
+        args = [java, '-mx' + heap, '-cp', classpath, 'LEGOClassifier', '-server',
+                '-sentimentModel', sentiment_model, '-annotators', annotators,
+                '-threads', str(threads)] + list(extra_args)
+        self.process = subprocess.Popen(args, cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr)
+        # one batch at a time, answers are matched to requests by their order
+        self.lock = threading.Lock()
+
+    def _write_requests(self, texts, errors):
+        try:
+            for text in texts:
+                self.process.stdin.write(_request(text))
+            self.process.stdin.flush()
+        except Exception as e:
+            errors.append(e)
+
+    def classify_many(self, texts):
+        """Returns (review score, [sentence classes]) for every text, in order"""
+        texts = list(texts)
+        with self.lock:
+            errors = []
+            writer = threading.Thread(target=self._write_requests, args=(texts, errors))
+            writer.daemon = True
+            writer.start()
+            results = []
+            for _ in texts:
+                line = self.process.stdout.readline()
+                if not line:
+                    raise RuntimeError("CoreNLP worker exited with status %s" % self.process.poll())
+                results.append(parse_result(line))
+            writer.join()
+            if errors:
+                raise errors[0]
+            return results
+
+    def classify(self, text):
+        return self.classify_many([text])[0]
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, value, traceback):
+        self.close()
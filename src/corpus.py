@@ -0,0 +1,121 @@
+import array
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+
+class CorpusStore:
+    """
+    Columnar on-disk corpus of sanitized posts: an int8 ratings array, an int64 offsets array and one
+    concatenated UTF-8 text blob. Opening a store only memory-maps the three files, rows are sliced
+    straight out of the mapping.
+    """
+    RATINGS = 'ratings.npy'
+    OFFSETS = 'offsets.npy'
+    TEXTS = 'texts.bin'
+    META = 'meta.json'
+
+    def __init__(self, path):
+        self.path = path
+        self.ratings = np.load(os.path.join(path, self.RATINGS), mmap_mode='r')
+        self.offsets = np.load(os.path.join(path, self.OFFSETS), mmap_mode='r')
+        texts_path = os.path.join(path, self.TEXTS)
+        if os.path.getsize(texts_path) > 0:
+            self.texts = np.memmap(texts_path, dtype=np.uint8, mode='r')
+        else:
+            # mmap refuses empty files
+            self.texts = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return self.ratings.shape[0]
+
+    def text_view(self, i):
+        """Zero-copy uint8 view of the UTF-8 bytes of row i"""
+        return self.texts[self.offsets[i]:self.offsets[i + 1]]
+
+    def text(self, i):
+        return self.text_view(i).tostring()
+
+    def texts_at(self, indices):
+        return [self.text(i) for i in indices]
+
+    def iter_records(self, indices=None):
+        if indices is None:
+            indices = range(len(self))
+        for i in indices:
+            yield int(self.ratings[i]), self.text(i)
+
+    @staticmethod
+    def _source_stat(source_path):
+        if source_path is None or not os.path.isfile(source_path):
+            return None
+        stat = os.stat(source_path)
+        return [stat.st_size, stat.st_mtime]
+
+    @classmethod
+    def is_current(cls, path, source_path):
+        """True if the store at path was written from source_path as it is now"""
+        source = cls._source_stat(source_path)
+        meta_path = os.path.join(path, cls.META)
+        if source is None or not os.path.isfile(meta_path):
+            return False
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        return meta.get('source') == source
+
+    def digest(self):
+        """sha1 of the stored texts, ratings and offsets, i.e. of the corpus content regardless of its source"""
+        meta_path = os.path.join(self.path, self.META)
+        if os.path.isfile(meta_path):
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            if 'digest' in meta:
+                return meta['digest']
+        # stores written before digests were recorded
+        digest = hashlib.sha1()
+        for start in range(0, self.texts.shape[0], 1 << 20):
+            digest.update(self.texts[start:start + (1 << 20)].tostring())
+        digest.update(np.ascontiguousarray(self.ratings, dtype=np.int8).tostring())
+        digest.update(np.ascontiguousarray(self.offsets, dtype=np.int64).tostring())
+        return digest.hexdigest()
+
+    @classmethod
+    def write(cls, path, records, source_path=None):
+        """
+        Writes (rating, text) records to a new store at path. Texts are appended to the blob as they
+        arrive, so only the ratings and offsets are kept in memory while writing.
+        """
+        tmp_path = path + '.tmp'
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+
+        ratings = array.array('b')
+        offsets = array.array('l', [0])
+        digest = hashlib.sha1()
+        with open(os.path.join(tmp_path, cls.TEXTS), 'wb') as blob:
+            for rating, text in records:
+                if not isinstance(text, bytes):
+                    text = text.encode('utf-8')
+                blob.write(text)
+                digest.update(text)
+                ratings.append(rating)
+                offsets.append(offsets[-1] + len(text))
+
+        ratings = np.asarray(ratings, dtype=np.int8)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        digest.update(ratings.tostring())
+        digest.update(offsets.tostring())
+        np.save(os.path.join(tmp_path, cls.RATINGS), ratings)
+        np.save(os.path.join(tmp_path, cls.OFFSETS), offsets)
+        with open(os.path.join(tmp_path, cls.META), 'w') as f:
+            json.dump({'rows': len(ratings), 'source': cls._source_stat(source_path),
+                       'digest': digest.hexdigest()}, f)
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(tmp_path, path)
+        return cls(path)
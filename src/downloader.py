@@ -0,0 +1,109 @@
+from io import BytesIO
+
+import pycurl
+
+# We should ignore SIGPIPE when using pycurl.NOSIGNAL - see
+# the libcurl tutorial for more info.
+try:
+    import signal
+    signal.signal(signal.SIGPIPE, signal.SIG_IGN)
+except (ImportError, ValueError):
+    pass
+
+
+class CurlMultiDownloader:
+    """
+    POSTs form bodies to one endpoint through a single CurlMulti stack with a bounded pool of easy
+    handles, in the style of pycurl's examples/retriever-multi.py. Handles are reused between
+    transfers, so their kept-alive connections stay in the multi connection cache.
+    """
+    def __init__(self, url, concurrency=10, max_host_connections=4, connect_timeout=30, timeout=300):
+        assert concurrency >= 1, "invalid number of concurrent connections"
+        self.url = url
+        self.multi = pycurl.CurlMulti()
+        self.multi.setopt(pycurl.M_MAXCONNECTS, concurrency)
+        if max_host_connections:
+            # transfers over the cap wait inside libcurl until a connection to the host is free
+            self.multi.setopt(pycurl.M_MAX_HOST_CONNECTIONS, max_host_connections)
+
+        self.handles = []
+        for i in range(concurrency):
+            c = pycurl.Curl()
+            c.setopt(pycurl.URL, url)
+            c.setopt(pycurl.FOLLOWLOCATION, 1)
+            c.setopt(pycurl.MAXREDIRS, 5)
+            c.setopt(pycurl.CONNECTTIMEOUT, connect_timeout)
+            c.setopt(pycurl.TIMEOUT, timeout)
+            c.setopt(pycurl.NOSIGNAL, 1)
+            c.setopt(pycurl.TCP_KEEPALIVE, 1)
+            c.key = None
+            c.buffer = None
+            self.handles.append(c)
+
+    def fetch(self, jobs):
+        """
+        Runs (key, postfields) jobs and yields (key, http_status, body, error) as transfers finish,
+        which is not necessarily the order of the jobs. Failed transfers have a None status and body.
+        """
+        jobs = iter(jobs)
+        freelist = self.handles[:]
+        has_jobs = True
+        active = 0
+        while has_jobs or active:
+            # If there is a job to process and a free curl object, add to multi stack
+            while has_jobs and freelist:
+                try:
+                    key, postfields = next(jobs)
+                except StopIteration:
+                    has_jobs = False
+                    break
+                c = freelist.pop()
+                c.key = key
+                c.buffer = BytesIO()
+                c.setopt(pycurl.POSTFIELDS, postfields)
+                c.setopt(pycurl.WRITEDATA, c.buffer)
+                self.multi.add_handle(c)
+                active += 1
+
+            # Run the internal curl state machine for the multi stack
+            while 1:
+                ret, num_handles = self.multi.perform()
+                if ret != pycurl.E_CALL_MULTI_PERFORM:
+                    break
+
+            # Check for curl objects which have terminated, and add them to the freelist
+            while 1:
+                num_q, ok_list, err_list = self.multi.info_read()
+                finished = []
+                for c in ok_list:
+                    self.multi.remove_handle(c)
+                    finished.append((c.key, c.getinfo(pycurl.RESPONSE_CODE), c.buffer.getvalue(), None))
+                for c, errno, errmsg in err_list:
+                    self.multi.remove_handle(c)
+                    finished.append((c.key, None, None, errmsg))
+                for c in ok_list + [c for c, _, _ in err_list]:
+                    c.buffer = None
+                    freelist.append(c)
+                active -= len(finished)
+                for result in finished:
+                    yield result
+                if num_q == 0:
+                    break
+
+            # Sleep until some more data is available, or until libcurl's own timer expires: transfers waiting
+            # for a free connection under M_MAX_HOST_CONNECTIONS only move on when perform() runs again.
+            # Handles freed above take the next jobs first, rather than waiting for the slowest transfer.
+            if active and not (has_jobs and freelist):
+                timeout = self.multi.timeout()
+                self.multi.select(1.0 if timeout < 0 else min(timeout / 1000.0, 1.0))
+
+    def close(self):
+        for c in self.handles:
+            c.close()
+        self.multi.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, value, traceback):
+        self.close()
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import zlib
+from itertools import islice
+from multiprocessing import Pool
+
+import numpy as np
+import scipy.sparse as sp
+
+# one tokenizer for these features and for LocalUclassify
+from uclassify.uclassify_tokens import DEFAULT_TOKEN_CONFIG, tokenize
+
+DEFAULT_CONFIG = dict(DEFAULT_TOKEN_CONFIG, ngram_range=[1, 2], n_features=1 << 20)
+
+
+def make_config(**overrides):
+    """DEFAULT_CONFIG with the given settings replaced; unknown settings are rejected"""
+    unknown = set(overrides) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError("unknown feature settings: %s" % ", ".join(sorted(unknown)))
+    config = dict(DEFAULT_CONFIG)
+    config.update(overrides)
+    config['ngram_range'] = list(config['ngram_range'])
+    return config
+
+
+def iter_ngrams(tokens, ngram_range):
+    low, high = ngram_range
+    for n in range(low, high + 1):
+        for i in range(len(tokens) - n + 1):
+            yield u" ".join(tokens[i:i + n])
+
+
+def hash_term(term, n_features):
+    # crc32 instead of hash(): stable across processes, runs and Python versions
+    return (zlib.crc32(term.encode('utf-8')) & 0xffffffff) % n_features
+
+
+def hash_texts(texts, config=DEFAULT_CONFIG):
+    """(texts x n_features) CSR matrix of hashed n-gram counts of a batch of texts"""
+    n_features = config['n_features']
+    ngram_range = config['ngram_range']
+    indices = []
+    indptr = [0]
+    for text in texts:
+        indices.extend(hash_term(term, n_features) for term in iter_ngrams(tokenize(text, config), ngram_range))
+        indptr.append(len(indices))
+    matrix = sp.csr_matrix((np.ones(len(indices), dtype=np.float64), np.array(indices, dtype=np.int32),
+                            np.array(indptr, dtype=np.int64)), shape=(len(indptr) - 1, n_features))
+    # repeated n-grams are separate entries until here
+    matrix.sum_duplicates()
+    return matrix
+
+
+def _hash_chunk(args):
+    texts, config = args
+    return hash_texts(texts, config)
+
+
+def _chunks(texts, chunk_size):
+    texts = iter(texts)
+    while True:
+        chunk = list(islice(texts, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def featurize(texts, config=DEFAULT_CONFIG, processes=None, chunk_size=2000):
+    """
+    Hashes an iterable of texts into one CSR matrix, one row per text in input order. Texts are consumed
+    in chunks of chunk_size; with processes > 1 the chunks are hashed by a worker pool.
+    """
+    chunks = ((chunk, config) for chunk in _chunks(texts, chunk_size))
+    if processes is not None and processes > 1:
+        pool = Pool(processes)
+        try:
+            blocks = list(pool.imap(_hash_chunk, chunks))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        blocks = [_hash_chunk(chunk) for chunk in chunks]
+    if not blocks:
+        return sp.csr_matrix((0, config['n_features']))
+    return sp.vstack(blocks, format='csr')
+
+
+def cache_key(corpus, config):
+    digest = hashlib.sha1(corpus.digest().encode('ascii'))
+    digest.update(json.dumps(config, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cached_features(corpus, cache_dir='../tmp/features', config=DEFAULT_CONFIG, processes=None):
+    """
+    Feature matrix of a CorpusStore, loaded from cache_dir when this corpus content was already hashed
+    with the same config, and hashed and stored there otherwise.
+    """
+    path = os.path.join(cache_dir, cache_key(corpus, config) + '.npz')
+    if os.path.isfile(path):
+        return sp.load_npz(path)
+    matrix = featurize((corpus.text(i) for i in range(len(corpus))), config, processes)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    # save under a temporary name first, so an interrupted run never leaves a truncated cache entry
+    tmp_path = path[:-len('.npz')] + '.tmp.npz'
+    sp.save_npz(tmp_path, matrix)
+    os.rename(tmp_path, path)
+    return matrix
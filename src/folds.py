@@ -0,0 +1,58 @@
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+
+def kfold_bounds(n_samples, n_folds=3):
+    """Contiguous test fold boundaries, identical to the unshuffled sklearn KFold"""
+    fold_sizes = [n_samples // n_folds] * n_folds
+    for i in range(n_samples % n_folds):
+        fold_sizes[i] += 1
+    bounds = []
+    start = 0
+    for size in fold_sizes:
+        bounds.append((start, start + size))
+        start += size
+    return bounds
+
+
+def assign_folds(n_samples, n_folds=3, labels=None):
+    """
+    Fold number of every row. Without labels the folds are contiguous blocks, like KFold; with labels
+    every label is split into contiguous blocks on its own, so each fold keeps the label proportions.
+    """
+    folds = np.empty(n_samples, dtype=np.int64)
+    if labels is None:
+        groups = [np.arange(n_samples)]
+    else:
+        labels = np.asarray(labels)
+        groups = [np.flatnonzero(labels == label) for label in np.unique(labels)]
+    for rows in groups:
+        for k, (start, stop) in enumerate(kfold_bounds(len(rows), n_folds)):
+            folds[rows[start:stop]] = k
+    return folds
+
+
+def fold_splits(n_samples, n_folds=3, labels=None):
+    """(train_index, test_index) per fold, both in row order"""
+    folds = assign_folds(n_samples, n_folds, labels)
+    return [(np.flatnonzero(folds != k), np.flatnonzero(folds == k)) for k in range(n_folds)]
+
+
+def run_folds(fold_fn, tasks, workers=None, processes=False):
+    """
+    Runs fold_fn on every fold task concurrently and returns the results in fold order. Threads suit
+    folds that wait on a service; processes suit CPU bound folds, for which fold_fn and the tasks must
+    be picklable.
+    """
+    tasks = list(tasks)
+    workers = min(workers or len(tasks), len(tasks))
+    if workers <= 1:
+        return [fold_fn(task) for task in tasks]
+    pool = Pool(workers) if processes else ThreadPool(workers)
+    try:
+        return pool.map(fold_fn, tasks)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,123 @@
+import ast
+import json
+import os
+
+import numpy as np
+
+
+class ResultWriter:
+    """
+    Append-only JSONL result store. Every record is one JSON object on its own line, so results can be
+    written while classification is still running and read back one record at a time.
+    """
+    def __init__(self, path, mode='a'):
+        self.path = path
+        torn = mode == 'a' and self._has_torn_tail(path)
+        self.file = open(path, mode)
+        if torn:
+            # terminate the partial line of an interrupted run so the next record starts on its own line
+            self.file.write("\n")
+
+    @staticmethod
+    def _has_torn_tail(path):
+        if not os.path.isfile(path) or os.path.getsize(path) == 0:
+            return False
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def write(self, record):
+        self.file.write(json.dumps(record, separators=(',', ':')) + "\n")
+
+    def write_all(self, records):
+        for record in records:
+            self.write(record)
+        self.flush()
+
+    def flush(self):
+        self.file.flush()
+
+    def sync(self):
+        """Flushes and fsyncs, so every record written so far survives a crash"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, value, traceback):
+        self.close()
+
+
+def iter_results(path):
+    """Streams the records of a JSONL result store"""
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # a torn last line left behind by an interrupted writer
+                continue
+
+
+def completed_rows(path, n_rows):
+    """Boolean mask of the rows that have a record without an error in the store at path"""
+    done = np.zeros(n_rows, dtype=bool)
+    if os.path.isfile(path):
+        for record in iter_results(path):
+            # later records of a row supersede earlier ones, e.g. a retried failure
+            done[record['row']] = 'error' not in record
+    return done
+
+
+def classification_record(row, text_coverage, classes):
+    return {
+        'row': int(row),
+        'coverage': float(text_coverage),
+        'p': dict((class_name, float(p)) for class_name, p in classes),
+    }
+
+
+def sentiment_record(row, body):
+    """Record of one text-processing.com response; bodies that are not JSON are kept as errors"""
+    try:
+        response = json.loads(body)
+    except ValueError:
+        return {'row': int(row), 'error': body}
+    if 'label' not in response:
+        return {'row': int(row), 'error': body}
+    return {'row': int(row), 'label': response['label'], 'probability': response['probability']}
+
+
+def migrate_classified_set(txt_path, jsonl_path):
+    """Converts a str() dumped uclassify result list to JSONL. Row ids are unknown there, so the text is kept"""
+    with open(txt_path, 'r') as f:
+        tuple_list = ast.literal_eval(f.read())
+    with ResultWriter(jsonl_path, 'w') as writer:
+        for text, text_coverage, classes in tuple_list:
+            record = classification_record(-1, text_coverage, classes)
+            del record['row']
+            record['text'] = text
+            writer.write(record)
+
+
+def migrate_sentiments(txt_path, jsonl_path):
+    """Converts the str() dumped list of text-processing.com responses to JSONL, one row per list entry"""
+    with open(txt_path, 'r') as f:
+        bodies = ast.literal_eval(f.read())
+    with ResultWriter(jsonl_path, 'w') as writer:
+        for row, body in enumerate(bodies):
+            writer.write(sentiment_record(row, body))
+
+
+def open_results(jsonl_path, legacy_path, migrate):
+    """Streams jsonl_path, migrating it from legacy_path first if only the old format exists"""
+    if not os.path.isfile(jsonl_path) and os.path.isfile(legacy_path):
+        migrate(legacy_path, jsonl_path)
+    return iter_results(jsonl_path)
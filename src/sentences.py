@@ -0,0 +1,98 @@
+import os
+from itertools import islice
+from multiprocessing import Pool, cpu_count
+
+PUNKT_RESOURCE = 'tokenizers/punkt/english.pickle'
+
+# Punkt model of this process, loaded once by load_punkt
+_punkt = None
+# local english.pickle or nltk_data directory; when set the model is never downloaded
+_punkt_path = None
+
+
+def configure_punkt(path=None):
+    """Makes load_punkt read the model from path (offline) instead of the nltk_data search path"""
+    global _punkt, _punkt_path
+    _punkt_path = path
+    _punkt = None
+
+
+def load_punkt():
+    """
+    Punkt model of this process, loaded on first use. Without a configured path it is looked up on the
+    nltk_data search path and downloaded once if it is missing there.
+    """
+    global _punkt
+    if _punkt is None:
+        # nltk takes most of a second to import, so it is only imported when sentences are split
+        import nltk
+        if _punkt_path is None:
+            try:
+                _punkt = nltk.data.load(PUNKT_RESOURCE)
+            except LookupError:
+                nltk.download('punkt', quiet=True)
+                _punkt = nltk.data.load(PUNKT_RESOURCE)
+        elif os.path.isdir(_punkt_path):
+            if _punkt_path not in nltk.data.path:
+                nltk.data.path.insert(0, _punkt_path)
+            _punkt = nltk.data.load(PUNKT_RESOURCE)
+        else:
+            _punkt = nltk.data.load('file:' + os.path.abspath(_punkt_path))
+    return _punkt
+
+
+def corenlp_test_block(score, text):
+    return str(score) + "\n" + str(text + "\n") + "\n"
+
+
+def corenlp_train_block(score, text):
+    """One "score<TAB>sentence" line and a blank line per Punkt sentence of the UTF-8 text"""
+    prefix = u"%d\t" % score
+    sentences = load_punkt().tokenize(text.decode('utf-8'))
+    return u"".join(prefix + sentence + u"\n\n" for sentence in sentences).encode('utf-8')
+
+
+def _init_worker(punkt_path):
+    # workers get the configured path explicitly, they need not share the parent's globals
+    configure_punkt(punkt_path)
+    load_punkt()
+
+
+def _format_chunk(chunk):
+    return [(corenlp_test_block(score, text), corenlp_train_block(score, text)) for score, text in chunk]
+
+
+def _chunks(rows, chunk_size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class SentenceSplitter:
+    """
+    Formats (score, text) rows into CoreNLP test and train blocks, sharding chunks of rows across worker
+    processes that each load the Punkt model once. Blocks come back in row order, so the output does not
+    depend on the number of processes.
+    """
+    def __init__(self, processes=None, chunk_size=256):
+        self.processes = processes if processes is not None else cpu_count()
+        self.chunk_size = chunk_size
+        self.pool = Pool(self.processes, initializer=_init_worker, initargs=(_punkt_path,)) \
+            if self.processes > 1 else None
+
+    def blocks(self, rows):
+        """Yields one list of (test_block, train_block) per chunk of rows"""
+        chunks = _chunks(rows, self.chunk_size)
+        if self.pool is None:
+            load_punkt()
+            return (_format_chunk(chunk) for chunk in chunks)
+        return self.pool.imap(_format_chunk, chunks)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
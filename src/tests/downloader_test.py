@@ -0,0 +1,75 @@
+import json
+import unittest
+
+from downloader import CurlMultiDownloader
+from tests import sentiment_app
+from tests.util import start_wsgi_server, unused_port
+
+
+class CurlMultiDownloaderTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server, base_url = start_wsgi_server(sentiment_app.app)
+        cls.url = base_url + '/api/sentiment/'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        sentiment_app.attempts.clear()
+
+    def fetch(self, texts, url=None, concurrency=4):
+        with CurlMultiDownloader(url or self.url, concurrency) as downloader:
+            return list(downloader.fetch((i, 'text=' + text) for i, text in enumerate(texts)))
+
+    def test_results(self):
+        texts = ['great set', 'fail', 'nice minifigs']
+        results = dict((key, (status, body, error)) for key, status, body, error in self.fetch(texts))
+        self.assertEqual(sorted(results), [0, 1, 2])
+        status, body, error = results[0]
+        self.assertEqual(status, 200)
+        self.assertIsNone(error)
+        self.assertEqual(json.loads(body.decode('utf-8'))['text'], 'great set')
+        # an HTTP error is a finished transfer, its status tells it apart
+        self.assertEqual(results[1][0], 500)
+        self.assertEqual(results[2][0], 200)
+
+    def test_slow_transfer_does_not_block_the_others(self):
+        texts = ['slow'] + ['post %d' % i for i in range(8)]
+        keys = [key for key, _, _, _ in self.fetch(texts, concurrency=4)]
+        self.assertEqual(sorted(keys), list(range(9)))
+        # results come in completion order, the slow post finishes last
+        self.assertEqual(keys[-1], 0)
+
+    def test_more_jobs_than_handles(self):
+        texts = ['post %d' % i for i in range(25)]
+        results = self.fetch(texts, concurrency=3)
+        self.assertEqual(sorted(key for key, _, _, _ in results), list(range(25)))
+        self.assertTrue(all(status == 200 for _, status, _, _ in results))
+        self.assertEqual(sum(sentiment_app.attempts.values()), 25)
+
+    def test_retry_failed_jobs(self):
+        # DownloadSentiments retries by fetching the failed rows again, over the same handles
+        with CurlMultiDownloader(self.url, 2) as downloader:
+            jobs = [(0, 'text=flaky'), (1, 'text=fine')]
+            first = dict((key, status) for key, status, _, _ in downloader.fetch(jobs))
+            self.assertEqual(first, {0: 503, 1: 200})
+            failed = [job for job in jobs if first[job[0]] != 200]
+            second = dict((key, status) for key, status, _, _ in downloader.fetch(failed))
+        self.assertEqual(second, {0: 200})
+        self.assertEqual(sentiment_app.attempts['flaky'], 2)
+        self.assertEqual(sentiment_app.attempts['fine'], 1)
+
+    def test_connection_error(self):
+        url = 'http://127.0.0.1:%d/api/sentiment/' % unused_port()
+        [(key, status, body, error)] = self.fetch(['great set'], url)
+        self.assertEqual(key, 0)
+        self.assertIsNone(status)
+        self.assertIsNone(body)
+        self.assertTrue(error)
+
+
+if __name__ == '__main__':
+    unittest.main()
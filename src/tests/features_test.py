@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import features
+from corpus import CorpusStore
+
+TEXTS = [u"Great set, great bricks", u"broken bricks", u"", u"caf\u00e9 caf\u00e9 au lait", b"bytes and BYTES"] * 7
+
+
+class FeaturesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.corpus = CorpusStore.write(os.path.join(self.tmp, 'corpus'),
+                                        [(i % 3 - 1, text) for i, text in enumerate(TEXTS)])
+        self.cache_dir = os.path.join(self.tmp, 'features')
+        self.featurize = features.featurize
+        self.featurize_calls = 0
+
+        def counting_featurize(*args, **kwargs):
+            self.featurize_calls += 1
+            return self.featurize(*args, **kwargs)
+        features.featurize = counting_featurize
+
+    def tearDown(self):
+        features.featurize = self.featurize
+        shutil.rmtree(self.tmp)
+
+    def assertSameMatrix(self, a, b):
+        self.assertEqual(a.shape, b.shape)
+        self.assertEqual((a != b).nnz, 0)
+
+    def test_hashed_ngram_counts(self):
+        config = features.make_config(n_features=1 << 10)
+        matrix = features.hash_texts([u"a b a", u""], config)
+        self.assertEqual(matrix.shape, (2, 1 << 10))
+        self.assertEqual(matrix.getrow(1).nnz, 0)
+        row = matrix.getrow(0).toarray().ravel()
+        expected = {}
+        for term in [u"a", u"b", u"a", u"a b", u"b a"]:
+            column = features.hash_term(term, 1 << 10)
+            expected[column] = expected.get(column, 0) + 1
+        self.assertEqual(dict((int(column), row[column]) for column in row.nonzero()[0]), expected)
+
+    def test_pooled_and_serial_runs_agree(self):
+        serial = self.featurize(TEXTS, chunk_size=4)
+        pooled = self.featurize(TEXTS, processes=3, chunk_size=4)
+        self.assertEqual(serial.shape, (len(TEXTS), features.DEFAULT_CONFIG['n_features']))
+        self.assertSameMatrix(serial, pooled)
+        self.assertSameMatrix(serial, features.hash_texts(TEXTS))
+
+    def test_cache_hits_for_same_corpus_and_config(self):
+        first = features.cached_features(self.corpus, self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        # a store rewritten with the same content has the same digest
+        corpus = CorpusStore.write(os.path.join(self.tmp, 'copy'), self.corpus.iter_records())
+        second = features.cached_features(corpus, self.cache_dir, config=features.make_config())
+        self.assertEqual(self.featurize_calls, 1)
+        self.assertSameMatrix(first, second)
+
+    def test_cache_misses_when_config_changes(self):
+        features.cached_features(self.corpus, self.cache_dir)
+        unigrams = features.cached_features(self.corpus, self.cache_dir, features.make_config(ngram_range=[1, 1]))
+        cased = features.cached_features(self.corpus, self.cache_dir, features.make_config(lowercase=False))
+        self.assertEqual(self.featurize_calls, 3)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 3)
+        self.assertLess(unigrams.nnz, cased.nnz)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from results import ResultWriter, classification_record, iter_results, migrate_classified_set, \
+    migrate_sentiments, open_results, sentiment_record
+
+
+class ResultWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'results.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_records_round_trip(self):
+        records = [classification_record(3, 0.5, [("pos", 0.75), ("neg", 0.25)]), {'row': 4, 'error': 'HTTP 500'}]
+        with ResultWriter(self.path, 'w') as writer:
+            writer.write_all(records)
+        self.assertEqual(list(iter_results(self.path)), records)
+
+    def test_append(self):
+        with ResultWriter(self.path, 'w') as writer:
+            writer.write({'row': 0})
+        with ResultWriter(self.path) as writer:
+            writer.write({'row': 1})
+        self.assertEqual([record['row'] for record in iter_results(self.path)], [0, 1])
+
+    def test_torn_tail(self):
+        with ResultWriter(self.path, 'w') as writer:
+            writer.write({'row': 0})
+        # an interrupted run left half a record behind
+        with open(self.path, 'a') as f:
+            f.write('{"row":1,"la')
+        self.assertEqual([record['row'] for record in iter_results(self.path)], [0])
+        with ResultWriter(self.path) as writer:
+            writer.write({'row': 2})
+        self.assertEqual([record['row'] for record in iter_results(self.path)], [0, 2])
+
+    def test_sentiment_record(self):
+        body = json.dumps({'label': 'pos', 'probability': {'pos': 0.9}})
+        self.assertEqual(sentiment_record(5, body), {'row': 5, 'label': 'pos', 'probability': {'pos': 0.9}})
+        self.assertEqual(sentiment_record(6, 'Form Validation Errors'), {'row': 6, 'error': 'Form Validation Errors'})
+        self.assertEqual(sentiment_record(7, '{"detail": "x"}'), {'row': 7, 'error': '{"detail": "x"}'})
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.txt_path = os.path.join(self.tmp, 'legacy.txt')
+        self.jsonl_path = os.path.join(self.tmp, 'results.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_migrate_classified_set(self):
+        with open(self.txt_path, 'w') as f:
+            f.write(str([('great set', 0.5, [('pos', 0.75), ('neg', 0.25)]),
+                         ('bad', 1.0, [('pos', 0.1), ('neg', 0.9)])]))
+        records = list(open_results(self.jsonl_path, self.txt_path, migrate_classified_set))
+        self.assertEqual(records, [{'text': 'great set', 'coverage': 0.5, 'p': {'pos': 0.75, 'neg': 0.25}},
+                                   {'text': 'bad', 'coverage': 1.0, 'p': {'pos': 0.1, 'neg': 0.9}}])
+
+    def test_migrate_sentiments(self):
+        with open(self.txt_path, 'w') as f:
+            f.write(str(['{"label": "neg", "probability": {"neg": 0.8}}', 'Form Validation Errors']))
+        records = list(open_results(self.jsonl_path, self.txt_path, migrate_sentiments))
+        self.assertEqual(records, [{'row': 0, 'label': 'neg', 'probability': {'neg': 0.8}},
+                                   {'row': 1, 'error': 'Form Validation Errors'}])
+
+    def test_existing_store_is_not_migrated_again(self):
+        with ResultWriter(self.jsonl_path, 'w') as writer:
+            writer.write({'row': 9, 'label': 'pos', 'probability': {}})
+        with open(self.txt_path, 'w') as f:
+            f.write(str(['{"label": "neg", "probability": {}}']))
+        self.assertEqual([record['row'] for record in open_results(self.jsonl_path, self.txt_path,
+                                                                   migrate_sentiments)], [9])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+# bottle stand-in for the text-processing.com sentiment API
+import collections
+import json
+import threading
+import time
+
+import bottle
+
+app = bottle.Bottle()
+# POSTs per text, so tests can tell first attempts from retries
+attempts = collections.Counter()
+lock = threading.Lock()
+
+
+@app.post('/api/sentiment/')
+def sentiment():
+    text = bottle.request.forms.get('text')
+    with lock:
+        attempts[text] += 1
+        attempt = attempts[text]
+    if text == 'fail':
+        bottle.abort(500, 'always fails')
+    if text == 'flaky' and attempt == 1:
+        bottle.abort(503, 'fails the first time')
+    if text == 'slow':
+        time.sleep(0.5)
+    bottle.response.content_type = 'application/json'
+    return json.dumps({'label': 'pos', 'probability': {'pos': 0.9, 'neg': 0.1, 'neutral': 0.2}, 'text': text})
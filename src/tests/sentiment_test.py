@@ -0,0 +1,168 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from corpus import CorpusStore
+from results import ResultWriter, completed_rows, iter_results
+from Sentiment import DownloadSentiments, SentimentV1Classifier, SentimentV2Classifier
+from tests import sentiment_app
+from tests.util import start_wsgi_server
+
+RECORDS = [(1, b"great set"), (-1, b"broken bricks"), (0, b"it is a set"), (1, b"love the bricks"),
+           (-1, b"bad set"), (0, b"a box of bricks")] * 4
+
+
+class InterruptingClassifier:
+    """Wraps an engine and fails its classify call number fail_at, like a crash in the middle of a fold"""
+    def __init__(self, engine, fail_at):
+        self.engine = engine
+        self.fail_at = fail_at
+        self.calls = 0
+
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+
+    def classify(self, texts, classifierName, username=None):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise RuntimeError("interrupted")
+        return self.engine.classify(texts, classifierName, username)
+
+
+class SentimentV1ClassifierTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.corpus = CorpusStore.write(os.path.join(self.tmp, 'corpus'), RECORDS)
+        self.v1 = SentimentV1Classifier(self.corpus, offline=True, chunk_size=3)
+        self.v1.results_prefix = os.path.join(self.tmp, 'classified_set')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_fold_results(self):
+        test_index = np.arange(8, 16)
+        self.v1.classify_fold((0, np.concatenate([np.arange(8), np.arange(16, 24)]), test_index))
+        records = list(iter_results(self.v1.results_prefix + '0.jsonl'))
+        self.assertEqual([record['row'] for record in records], list(test_index))
+        self.assertEqual(sorted(records[0]['p']), ['neg', 'neutral', 'pos'])
+
+    def test_interrupted_fold_keeps_finished_chunks(self):
+        self.v1.classifier = InterruptingClassifier(self.v1.classifier, fail_at=3)
+        test_index = np.arange(8, 16)
+        self.assertRaises(RuntimeError, self.v1.classify_fold,
+                          (0, np.concatenate([np.arange(8), np.arange(16, 24)]), test_index))
+        # two chunks of three rows made it to disk before the third classify call failed
+        records = list(iter_results(self.v1.results_prefix + '0.jsonl'))
+        self.assertEqual([record['row'] for record in records], list(test_index[:6]))
+        # the fold's classifier is removed all the same
+        self.assertEqual(self.v1.classifier.engine.classifiers, {})
+
+
+class DownloadSentimentsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server, base_url = start_wsgi_server(sentiment_app.app)
+        cls.url = base_url + '/api/sentiment/'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        sentiment_app.attempts.clear()
+        self.tmp = tempfile.mkdtemp()
+        self.results_file = os.path.join(self.tmp, 'results.jsonl')
+        texts = [b"great", b"fail", b"flaky", b"nice", b"slow"]
+        corpus = CorpusStore.write(os.path.join(self.tmp, 'corpus'), [(1, text) for text in texts])
+        self.downloader = DownloadSentiments(corpus)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def download(self):
+        self.downloader.download_sentiments(self.url, concurrency=2, results_file=self.results_file)
+        return completed_rows(self.results_file, 5)
+
+    def test_restart_retries_only_failed_rows(self):
+        self.assertEqual(self.download().tolist(), [True, False, False, True, True])
+        self.assertEqual(self.download().tolist(), [True, False, True, True, True])
+        self.assertEqual(dict(sentiment_app.attempts), {'great': 1, 'fail': 2, 'flaky': 2, 'nice': 1, 'slow': 1})
+        # the retried row's result supersedes its failure, the failure stays on record
+        records = [record for record in iter_results(self.results_file) if record['row'] == 2]
+        self.assertEqual(['error' in record for record in records], [True, False])
+        self.assertEqual(records[1]['label'], 'pos')
+
+    def test_restart_after_crash(self):
+        # an interrupted run: two rows done, half a record torn off at the end
+        with ResultWriter(self.results_file, 'w') as writer:
+            writer.write({'row': 0, 'label': 'pos', 'probability': {}})
+            writer.write({'row': 3, 'label': 'pos', 'probability': {}})
+        with open(self.results_file, 'a') as f:
+            f.write('{"row":4,"lab')
+        self.assertEqual(self.download().tolist(), [True, False, False, True, True])
+        self.assertEqual(dict(sentiment_app.attempts), {'fail': 1, 'flaky': 1, 'slow': 1})
+
+
+class ParseRecordingClassifier(SentimentV2Classifier):
+    """Records the heap and the number of concurrent calls of test_rows instead of parsing test sets"""
+    def __init__(self, n_folds):
+        SentimentV2Classifier.__init__(self, n_folds=n_folds)
+        self.lock = threading.Lock()
+        self.heaps = []
+        self.parsing = 0
+        self.max_parsing = 0
+
+    def test_rows(self, k, heap='4g', threads=1, cached_trees=False):
+        with self.lock:
+            self.heaps.append(heap)
+            self.parsing += 1
+            self.max_parsing = max(self.max_parsing, self.parsing)
+        time.sleep(0.05)
+        with self.lock:
+            self.parsing -= 1
+        return []
+
+
+class SweepCheckpointsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.model = os.path.join(self.tmp, 'model-%d.ser.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_test_sets_parsed_one_at_a_time(self):
+        v2 = ParseRecordingClassifier(n_folds=4)
+        v2.sweep_checkpoints(self.model, workers=4, parse_heap='3g')
+        self.assertEqual(v2.heaps, ['3g'] * 4)
+        self.assertEqual(v2.max_parsing, 1)
+
+    def test_parse_workers(self):
+        v2 = ParseRecordingClassifier(n_folds=4)
+        v2.sweep_checkpoints(self.model, workers=4, parse_workers=2)
+        self.assertEqual(v2.heaps, ['4g'] * 4)
+        self.assertEqual(v2.max_parsing, 2)
+
+
+class CompletedRowsTest(unittest.TestCase):
+    def test_later_records_override_earlier_ones(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'results.jsonl')
+            self.assertEqual(completed_rows(path, 3).tolist(), [False, False, False])
+            with ResultWriter(path, 'w') as writer:
+                writer.write_all([{'row': 0, 'error': 'HTTP 503'}, {'row': 1, 'label': 'pos'},
+                                  {'row': 0, 'label': 'neg'}, {'row': 1, 'error': 'HTTP 500'}])
+            self.assertEqual(completed_rows(path, 3).tolist(), [True, False, False])
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+# aiohttp flavour of the uclassify_app stand-in, Python 3 only
+import asyncio
+
+from aiohttp import web
+
+from tests import uclassify_app
+
+
+async def root(request):
+    status, xml, delay = uclassify_app.answer(await request.read())
+    await asyncio.sleep(delay)
+    return web.Response(status=status, text=xml, content_type='text/xml')
+
+
+async def start_server():
+    """Serves the app on a free local port of the running loop and returns (runner, base url)"""
+    app = web.Application()
+    app.router.add_post('/', root)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner, 'http://127.0.0.1:%d' % runner.addresses[0][1]
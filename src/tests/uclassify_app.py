@@ -0,0 +1,84 @@
+# bottle stand-in for the uClassify XML API
+import base64
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+
+import bottle
+
+REQUEST = '{http://api.uclassify.com/1/RequestSchema}'
+_HEADER = '<?xml version="1.0" encoding="utf-8" ?>' \
+          '<uclassify xmlns="http://api.uclassify.com/1/ResponseSchema" version="1.01">'
+
+app = bottle.Bottle()
+lock = threading.Lock()
+# requests: (call tag, texts) of every request that reached the app
+# statuses: HTTP statuses to answer the next requests with, before answering normally
+# max_bytes: larger requests fail with status 4013
+# drop_results: number of classify results left out of every answer
+# delays: seconds to wait before answering a request with one of these texts
+# in_flight, max_in_flight: requests being answered by the bottle app now, and at most so far
+state = {}
+
+
+def reset():
+    with lock:
+        state.update(requests=[], statuses=[], max_bytes=None, drop_results=0, delays={}, in_flight=0,
+                     max_in_flight=0)
+
+
+reset()
+
+
+def score(text):
+    """The p of class 'length' the app gives a text, so tests can match results to texts"""
+    return len(text) / 1000.0
+
+
+def _status(success, code, text=''):
+    return '<status success="%s" statusCode="%s">%s</status>' % ('true' if success else 'false', code, text)
+
+
+def answer(body):
+    """(HTTP status, response XML, seconds to wait before sending it) of a request body"""
+    doc = ElementTree.fromstring(body)
+    texts = dict((elem.get('id'), base64.b64decode(elem.text or '').decode('utf-8'))
+                 for elem in doc.iter(REQUEST + 'textBase64'))
+    calls = [call for call in doc.iter() if call.tag in (REQUEST + 'classify', REQUEST + 'train')]
+    call_texts = [texts[call.get('textId')] for call in calls]
+    with lock:
+        state['requests'].append((calls[0].tag[len(REQUEST):] if calls else None, call_texts))
+        status = state['statuses'].pop(0) if state['statuses'] else None
+        max_bytes = state['max_bytes']
+        drop_results = state['drop_results']
+        delay = max([state['delays'].get(text, 0) for text in call_texts] + [0])
+    if status is not None:
+        return status, 'unavailable', 0
+    if max_bytes is not None and len(body) > max_bytes:
+        return 200, _HEADER + _status(False, 4013, 'Request too large') + '</uclassify>', 0
+    if doc.find(REQUEST + 'writeCalls') is not None:
+        return 200, _HEADER + _status(True, 2000) + '</uclassify>', delay
+
+    out = [_HEADER, _status(True, 2000), '<readCalls>']
+    for call, text in list(zip(calls, call_texts))[:len(calls) - drop_results]:
+        out.append('<classify id="%s"><classification textCoverage="1"><class className="length" p="%s"/>'
+                   '</classification></classify>' % (call.get('id'), score(text)))
+    out.append('</readCalls></uclassify>')
+    return 200, ''.join(out), delay
+
+
+@app.post('/')
+def root():
+    with lock:
+        state['in_flight'] += 1
+        state['max_in_flight'] = max(state['max_in_flight'], state['in_flight'])
+    try:
+        status, xml, delay = answer(bottle.request.body.read())
+        time.sleep(delay)
+    finally:
+        with lock:
+            state['in_flight'] -= 1
+    if status != 200:
+        bottle.abort(status, xml)
+    bottle.response.content_type = 'text/xml; charset=utf-8'
+    return xml
@@ -0,0 +1,77 @@
+import sys
+import time
+import unittest
+
+from tests import uclassify_app
+from uclassify import uclassify_xml
+from uclassify.uclassify_eh import uClassifyError
+
+if sys.version_info >= (3,):
+    import asyncio
+    from tests import uclassify_aiohttp_app
+    from uclassify.uclassify_async import AsyncUclassify
+
+
+@unittest.skipIf(sys.version_info < (3,), "the asyncio client needs Python 3")
+class AsyncUclassifyTest(unittest.TestCase):
+    def setUp(self):
+        uclassify_app.reset()
+        self.loop = asyncio.new_event_loop()
+        self.runner, url = self.run_async(uclassify_aiohttp_app.start_server())
+        self.client = AsyncUclassify(backoff_factor=0.05, timeout=5, batch_size=4)
+        self.client.api_url = url
+        self.client.setReadApiKey("read")
+        self.client.setWriteApiKey("write")
+
+    def tearDown(self):
+        self.run_async(self.client.close())
+        self.run_async(self.runner.cleanup())
+        self.loop.close()
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def assertScores(self, result, texts):
+        self.assertEqual(result, [(text, 1.0, [("length", uclassify_app.score(text))]) for text in texts])
+
+    def test_batches_in_order(self):
+        texts = ['x' * n for n in range(10)]
+        # the first batch is answered last, its results still come first
+        uclassify_app.state['delays'] = {texts[0]: 0.2}
+        result = self.run_async(self.client.classify(texts, "lengths"))
+        self.assertScores(result, texts)
+        self.assertEqual(sorted(uclassify_app.state['requests']),
+                         [('classify', texts[:4]), ('classify', texts[4:8]), ('classify', texts[8:])])
+
+    def test_split_too_large_batches(self):
+        texts = ['x' * n for n in range(1, 9)]
+        # requests of two texts fit, the batches of four do not
+        uclassify_app.state['max_bytes'] = len(uclassify_xml.build_classify(b"classify", "read", texts[6:], "lengths"))
+        result = self.run_async(self.client.classify(texts, "lengths"))
+        self.assertScores(result, texts)
+        sent = [batch for call, batch in uclassify_app.state['requests'] if len(batch) < 4]
+        self.assertEqual(sorted(sent), [texts[0:2], texts[2:4], texts[4:6], texts[6:8]])
+
+    def test_backoff_on_unavailable(self):
+        uclassify_app.state['statuses'] = [503, 503]
+        start = time.time()
+        result = self.run_async(self.client.classify(['a', 'bb'], "lengths"))
+        self.assertScores(result, ['a', 'bb'])
+        # 0.05 s before the first retry, doubled before the second
+        self.assertGreaterEqual(time.time() - start, 0.15)
+        self.assertEqual(len(uclassify_app.state['requests']), 3)
+
+    def test_write_not_resent_after_gateway_timeout(self):
+        uclassify_app.state['statuses'] = [504]
+        self.assertRaises(uClassifyError, self.run_async, self.client.train(['a'], "short", "lengths"))
+        self.assertEqual(uclassify_app.state['requests'], [('train', ['a'])])
+
+    def test_missing_results(self):
+        uclassify_app.state['drop_results'] = 1
+        with self.assertRaises(uClassifyError) as cm:
+            self.run_async(self.client.classify(['a', 'bb', 'ccc'], "lengths"))
+        self.assertIn("2 results for 3 texts", str(cm.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from uclassify import ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'cache.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def put(self, cache, key, size):
+        cache.put(key, key.encode('ascii') * size)
+        # last_used has to tell the entries apart
+        time.sleep(0.01)
+
+    def test_evicts_least_recently_used(self):
+        cache = ResponseCache(self.path, max_bytes=30)
+        for key in ['a', 'b', 'c']:
+            self.put(cache, key, 10)
+        self.assertEqual(cache.get('a'), b'a' * 10)
+        time.sleep(0.01)
+        self.put(cache, 'd', 10)
+        self.assertEqual(sorted(cache.get_many(['a', 'b', 'c', 'd'])), ['a', 'c', 'd'])
+        self.assertEqual(cache.total_bytes, 30)
+        # two entries have to go for a large one, the least recently used first
+        self.put(cache, 'e', 20)
+        self.assertEqual(sorted(cache.get_many(['a', 'b', 'c', 'd', 'e'])), ['d', 'e'])
+        self.assertEqual(cache.total_bytes, 30)
+        cache.close()
+
+    def test_total_bytes(self):
+        cache = ResponseCache(self.path, max_bytes=1000)
+        self.put(cache, 'a', 10)
+        cache.put_many({'b': b'b' * 20, 'c': b'c' * 30})
+        self.assertEqual(cache.total_bytes, 60)
+        # a replaced value only counts with its new size
+        self.put(cache, 'b', 5)
+        self.assertEqual(cache.total_bytes, 45)
+        cache.close()
+        reopened = ResponseCache(self.path, max_bytes=1000)
+        self.assertEqual(reopened.total_bytes, 45)
+        self.assertEqual(reopened.get('b'), b'b' * 5)
+        reopened.close()
+
+    def test_shared_file(self):
+        first = ResponseCache(self.path)
+        second = ResponseCache(self.path)
+        key = ResponseCache.key("classify", "user/sets", u"Great  set")
+        first.put(key, b"result")
+        self.assertEqual(second.get(ResponseCache.key("classify", "user/sets", b"Great set")), b"result")
+        self.assertIsNone(second.get(ResponseCache.key("classify", "user/other", u"Great set")))
+        first.close()
+        second.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+
+from features import make_config
+from uclassify import LocalUclassify
+
+
+class LocalUclassifyTest(unittest.TestCase):
+    def trained(self, config=None):
+        engine = LocalUclassify() if config is None else LocalUclassify(config)
+        engine.create("sets")
+        engine.addClass(["pos", "neg"], "sets")
+        engine.train(["great set", "love the bricks"], "pos", "sets")
+        engine.train(["broken bricks", "bad set"], "neg", "sets")
+        return engine
+
+    def test_classify(self):
+        (text, coverage, classes), = self.trained().classify([u"GREAT, unknown"], "sets")
+        self.assertEqual(text, u"GREAT, unknown")
+        self.assertEqual(coverage, 0.5)
+        self.assertGreater(dict(classes)["pos"], dict(classes)["neg"])
+
+    def test_tokenizer_config(self):
+        engine = self.trained(make_config(lowercase=False))
+        self.assertEqual(engine.classify([u"GREAT"], "sets")[0][1], 0.0)
+        self.assertEqual(engine.classify([u"great"], "sets")[0][1], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,242 @@
+import base64
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from xml.dom.minidom import Document
+
+from tests import uclassify_app
+from tests.util import start_wsgi_server
+from uclassify import ResponseCache, uclassify, uclassify_xml
+from uclassify.uclassify_eh import uClassifyError
+
+
+class UclassifyTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.url = start_wsgi_server(uclassify_app.app)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        uclassify_app.reset()
+        self.client = uclassify(backoff_factor=0, timeout=5, batch_size=4, parallel_batches=2)
+        self.client.api_url = self.url
+        self.client.setReadApiKey("read")
+        self.client.setWriteApiKey("write")
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.client.close()
+        shutil.rmtree(self.tmp)
+
+    def test_classify_in_batches(self):
+        texts = ['x' * n for n in range(10)]
+        result = self.client.classify(texts, "lengths")
+        self.assertEqual([text for text, _, _ in result], texts)
+        self.assertEqual([classes for _, _, classes in result],
+                         [[("length", uclassify_app.score(text))] for text in texts])
+        self.assertEqual(sorted(uclassify_app.state['requests']),
+                         [('classify', texts[:4]), ('classify', texts[4:8]), ('classify', texts[8:])])
+
+    def test_parallel_batches_capped_by_pool(self):
+        client = uclassify(pool_size=2, parallel_batches=8)
+        self.assertEqual(client.parallel_batches, 2)
+        client.close()
+
+    def test_concurrent_calls_share_the_pool(self):
+        client = uclassify(pool_size=2, timeout=5, batch_size=1, parallel_batches=2)
+        client.api_url = self.url
+        client.setReadApiKey("read")
+        texts = ['x' * n for n in range(1, 7)]
+        uclassify_app.state['delays'] = dict((text, 0.05) for text in texts)
+        threads_before = threading.active_count()
+        results = {}
+
+        def fold(k):
+            results[k] = client.classify(texts, "lengths")
+        # three folds at two batches each, through two connections
+        folds = [threading.Thread(target=fold, args=(k,)) for k in range(3)]
+        for thread in folds:
+            thread.start()
+        for thread in folds:
+            thread.join()
+        client.close()
+        self.assertEqual([[text for text, _, _ in results[k]] for k in range(3)], [texts] * 3)
+        self.assertEqual(len(uclassify_app.state['requests']), 18)
+        self.assertLessEqual(uclassify_app.state['max_in_flight'], 2)
+        # the batch threads of every call are gone once it returned
+        self.assertEqual(threading.active_count(), threads_before)
+
+    def test_retry_unavailable(self):
+        uclassify_app.state['statuses'] = [503, 503]
+        result = self.client.classify(['a'], "lengths")
+        self.assertEqual(result, [('a', 1.0, [("length", uclassify_app.score('a'))])])
+        self.assertEqual(len(uclassify_app.state['requests']), 3)
+
+    def test_write_not_resent_after_gateway_timeout(self):
+        uclassify_app.state['statuses'] = [504]
+        self.assertRaises(uClassifyError, self.client.train, ['a'], "short", "lengths")
+        self.assertEqual(uclassify_app.state['requests'], [('train', ['a'])])
+
+    def test_missing_results(self):
+        uclassify_app.state['drop_results'] = 1
+        with self.assertRaises(uClassifyError) as cm:
+            self.client.classify(['a', 'bb', 'ccc'], "lengths")
+        self.assertIn("2 results for 3 texts", str(cm.exception))
+
+    def test_missing_results_are_not_cached(self):
+        self.client.setCache(ResponseCache(os.path.join(self.tmp, 'cache.db')))
+        self.client.classify(['a'], "lengths")
+        uclassify_app.state['drop_results'] = 1
+        self.assertRaises(uClassifyError, self.client.classify, ['a', 'bb', 'ccc'], "lengths")
+        uclassify_app.state['drop_results'] = 0
+        del uclassify_app.state['requests'][:]
+        result = self.client.classify(['a', 'bb', 'ccc'], "lengths")
+        self.assertEqual([classes for _, _, classes in result],
+                         [[("length", uclassify_app.score(text))] for text in ['a', 'bb', 'ccc']])
+        # only the text cached before the failed call is served from the cache
+        self.assertEqual(uclassify_app.state['requests'], [('classify', ['bb', 'ccc'])])
+
+    def classifyRequests(self, texts, classifierName):
+        """Number of requests one classify call makes"""
+        before = len(uclassify_app.state['requests'])
+        self.client.classify(texts, classifierName)
+        return len(uclassify_app.state['requests']) - before
+
+    def test_trained_classifier_is_cached(self):
+        self.client.setCache(ResponseCache(os.path.join(self.tmp, 'cache.db')))
+        self.client.create("lengths")
+        self.client.addClass(["length"], "lengths")
+        self.client.train(['a'], "length", "lengths")
+        self.assertEqual(self.classifyRequests(['bb'], "lengths"), 1)
+        self.assertEqual(self.classifyRequests(['bb'], "lengths"), 0)
+        # retrained, the classifier has a new state with new cache keys
+        self.client.train(['ccc'], "length", "lengths")
+        self.assertEqual(self.classifyRequests(['bb'], "lengths"), 1)
+
+    def test_cache_shared_by_clients(self):
+        path = os.path.join(self.tmp, 'cache.db')
+        self.client.setCache(ResponseCache(path))
+        first = self.client.classify(['a', 'bb', 'ccc'], "lengths", "user")
+        second_client = uclassify(timeout=5)
+        second_client.api_url = self.url
+        second_client.setReadApiKey("read")
+        second_client.setCache(ResponseCache(path))
+        del uclassify_app.state['requests'][:]
+        try:
+            self.assertEqual(second_client.classify(['a', 'bb', 'ccc'], "lengths", "user"), first)
+        finally:
+            second_client.close()
+        self.assertEqual(uclassify_app.state['requests'], [])
+
+    def test_failed_write_is_not_cached(self):
+        self.client.setCache(ResponseCache(os.path.join(self.tmp, 'cache.db')))
+        self.client.create("lengths")
+        self.client.addClass(["length"], "lengths")
+        uclassify_app.state['statuses'] = [500]
+        self.assertRaises(uClassifyError, self.client.train, ['a'], "length", "lengths")
+        self.assertIsNone(self.client._classifierIdentity("lengths", None))
+        self.assertEqual(self.classifyRequests(['bb'], "lengths"), 1)
+        self.assertEqual(self.classifyRequests(['bb'], "lengths"), 1)
+        # later writes build on the unknown state, so they do not make the classifier cacheable again
+        self.client.train(['a'], "length", "lengths")
+        self.assertIsNone(self.client._classifierIdentity("lengths", None))
+
+
+def minidomRequest(readCalls, texts, calls):
+    """Request XML as the minidom builder RequestWriter replaced wrote it.
+       :param readCalls: (required) (tag, attributes) of the readCalls/writeCalls element.
+       :param texts: (required) List of (text id, text) in the <texts> element, or None for no such element.
+       :param calls: (required) List of (tag, attributes) calls.
+    """
+    doc = Document()
+    root_element = doc.createElementNS(uclassify_xml.REQUEST_SCHEMA, 'uclassify')
+    elements = [(root_element, [("version", "1.01"), ("xmlns", uclassify_xml.REQUEST_SCHEMA)])]
+    doc.appendChild(root_element)
+    if texts is not None:
+        textstag = doc.createElement("texts")
+        root_element.appendChild(textstag)
+        for text_id, text in texts:
+            textbase64 = doc.createElement("textBase64")
+            elements.append((textbase64, [("id", text_id)]))
+            textbase64.appendChild(doc.createTextNode(base64.b64encode(text.encode('utf-8')).decode('ascii')))
+            textstag.appendChild(textbase64)
+    callstag = doc.createElement(readCalls[0])
+    elements.append((callstag, readCalls[1]))
+    root_element.appendChild(callstag)
+    for tag, attributes in calls:
+        call = doc.createElement(tag)
+        elements.append((call, attributes))
+        callstag.appendChild(call)
+    # minidom writes attributes sorted up to Python 3.7 and in insertion order from 3.8 on, RequestWriter always
+    # sorts them; setting them sorted gives the same bytes on every version
+    for element, attributes in elements:
+        for name, value in sorted(attributes):
+            element.setAttribute(name, value)
+    return doc.toxml().encode('utf-8')
+
+
+class RequestWriterTest(unittest.TestCase):
+    TEXTS = [u'plain text', u'&<>" in a text', u'caf\u00e9 \u20ac \U0001F600', u'']
+    NAME = u'A&B <"sets"> caf\u00e9'
+
+    def trainRequest(self, texts):
+        ids = [self.NAME + u"Text" + str(counter) for counter in range(1, len(texts) + 1)]
+        return minidomRequest(("writeCalls", [("writeApiKey", u"w&<>\""), ("classifierName", self.NAME)]),
+                              list(zip(ids, texts)),
+                              [("train", [("id", u"Train" + self.NAME + str(counter)), ("className", self.NAME),
+                                          ("textId", text_id)]) for counter, text_id in enumerate(ids, 1)])
+
+    def classifyRequest(self, texts, username):
+        calls = []
+        for counter in range(1, len(texts) + 1):
+            attributes = [("id", "Classify" + str(counter)), ("classifierName", self.NAME),
+                          ("textId", "Classifytext" + str(counter))]
+            if username is not None:
+                attributes.append(("username", username))
+            calls.append(("classify", attributes))
+        ids = ["Classifytext" + str(counter) for counter in range(1, len(texts) + 1)]
+        return minidomRequest(("readCalls", [("readApiKey", u"r&<>\"")]), list(zip(ids, texts)), calls)
+
+    def test_build_train(self):
+        for texts in [self.TEXTS, []]:
+            self.assertEqual(uclassify_xml.build_train(b"train", u"Train", u"w&<>\"", texts, self.NAME, self.NAME),
+                             self.trainRequest(texts))
+
+    def test_build_classify(self):
+        for texts in [self.TEXTS, []]:
+            for username in [None, u'us&r \u00e9']:
+                self.assertEqual(uclassify_xml.build_classify(b"classify", u"r&<>\"", texts, self.NAME, username),
+                                 self.classifyRequest(texts, username))
+
+    def test_build_class_calls(self):
+        expected = minidomRequest(("writeCalls", [("writeApiKey", "w"), ("classifierName", self.NAME)]), None,
+                                  [("addClass", [("id", u"AddClass" + name), ("className", name)])
+                                   for name in [u'pos', self.NAME]])
+        self.assertEqual(uclassify_xml.build_class_calls(b"addClass", u"AddClass", "w", [u'pos', self.NAME], self.NAME),
+                         expected)
+
+
+class IterBatchesTest(unittest.TestCase):
+    def test_batch_bytes_of_unicode_texts(self):
+        # 2, 3 and 4 bytes per character in UTF-8
+        texts = [u'\u00e9' * 300, u'\u20ac' * 200, u'\U0001F600' * 150] * 3
+        batches = list(uclassify_xml.iter_batches(texts, 100, 2000))
+        self.assertEqual([text for batch in batches for text in batch], texts)
+        empty = len(uclassify_xml.build_classify(b"classify", "read", [], "lengths"))
+        for batch in batches:
+            self.assertLessEqual(len(uclassify_xml.build_classify(b"classify", "read", batch, "lengths")) - empty,
+                                 2000)
+
+    def test_batch_size(self):
+        batches = list(uclassify_xml.iter_batches(['a'] * 7, 3, 2 * 1024 * 1024))
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
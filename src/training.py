@@ -0,0 +1,227 @@
+from __future__ import division
+import argparse
+import glob
+import json
+import os
+import re
+import subprocess
+import time
+from multiprocessing import cpu_count
+
+from corenlp import CORENLP_CLASSPATH, CORENLP_HOME
+
+MODELS_DIR = '../corenlp/models'
+JOBS_DIR = '../tmp/training'
+# a JVM needs memory beyond its maximum heap: metaspace, thread stacks, code cache
+JVM_OVERHEAD_MB = 512
+
+
+def heap_megabytes(heap):
+    """Megabytes of a java -mx size such as 10g, 4000m or 4000"""
+    match = re.match(r"^(\d+)([kmg]?)$", heap.lower())
+    if match is None:
+        raise ValueError("not a heap size: %s" % heap)
+    size, unit = int(match.group(1)), match.group(2)
+    if unit == 'g':
+        return size * 1024
+    if unit == 'k':
+        return size // 1024
+    return size
+
+
+def physical_memory_mb():
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1 << 20)
+
+
+class TrainingJob:
+    """
+    One SentimentTraining run: a train set and hyperparameters, producing model in the models directory
+    and checkpoints named model-<epoch>-<dev score>.ser.gz next to it.
+    """
+    def __init__(self, name, train_path, dev_path, model, epochs=10, num_hid=25, threads=8, heap='10g',
+                 extra_args=()):
+        self.name = name
+        self.train_path = train_path
+        self.dev_path = dev_path
+        self.model = model
+        self.epochs = epochs
+        self.num_hid = num_hid
+        self.threads = threads
+        self.heap = heap
+        self.extra_args = list(extra_args)
+
+    @property
+    def memory_mb(self):
+        return heap_megabytes(self.heap) + JVM_OVERHEAD_MB
+
+    def args(self, models_dir=MODELS_DIR, java='java', classpath=CORENLP_CLASSPATH):
+        return [java, '-mx' + self.heap, '-cp', classpath, 'edu.stanford.nlp.sentiment.SentimentTraining',
+                '-epochs', str(self.epochs), '-numHid', str(self.num_hid),
+                '-trainPath', os.path.abspath(self.train_path), '-devPath', os.path.abspath(self.dev_path),
+                '-train', '-nthreads', str(self.threads),
+                '-model', os.path.abspath(os.path.join(models_dir, self.model))] + self.extra_args
+
+
+def grid_jobs(train_pattern, dev_path, folds, epochs=(10,), num_hid=(25,), threads=8, heap='10g'):
+    """
+    One job per fold and hyperparameter combination. A single combination keeps the sentiment_model_<fold>
+    names the evaluation expects; a grid adds the hyperparameters to the names.
+    """
+    jobs = []
+    for k in folds:
+        for n_epochs in epochs:
+            for n_hid in num_hid:
+                if len(epochs) == 1 and len(num_hid) == 1:
+                    name = str(k)
+                else:
+                    name = '%d_e%d_h%d' % (k, n_epochs, n_hid)
+                jobs.append(TrainingJob(name, train_pattern % k, dev_path, 'sentiment_model_%s.ser.gz' % name,
+                                        n_epochs, n_hid, threads, heap))
+    return jobs
+
+
+class TrainingScheduler:
+    """
+    Runs SentimentTraining jobs side by side, as many as fit into the CPU and memory budget; a job
+    takes its -nthreads CPUs and its heap plus JVM overhead. Pending jobs start in order as soon as they
+    fit, a job larger than the whole budget runs alone. Every job gets a directory in jobs_dir with its
+    log and a job.json state file; a restart skips the jobs that are done, with the same arguments and
+    their model still in place, and runs the others from the start.
+    """
+    def __init__(self, cpus=None, memory_mb=None, models_dir=MODELS_DIR, jobs_dir=JOBS_DIR, java='java',
+                 classpath=CORENLP_CLASSPATH, cwd=CORENLP_HOME, poll_interval=5):
+        self.cpus = cpus or cpu_count()
+        self.memory_mb = memory_mb or physical_memory_mb()
+        self.models_dir = models_dir
+        self.jobs_dir = jobs_dir
+        self.java = java
+        self.classpath = classpath
+        self.cwd = cwd
+        self.poll_interval = poll_interval
+
+    def _state_path(self, job):
+        return os.path.join(self.jobs_dir, job.name, 'job.json')
+
+    def _args(self, job):
+        return job.args(self.models_dir, self.java, self.classpath)
+
+    def state(self, job):
+        """The job.json of the last run of job, None if it never finished"""
+        path = self._state_path(job)
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def is_done(self, job):
+        state = self.state(job)
+        return state is not None and state['status'] == 'done' and state['args'] == self._args(job) \
+            and os.path.isfile(os.path.join(self.models_dir, job.model))
+
+    def checkpoints(self, job):
+        """Intermediate models the job wrote, in the order SentimentTraining names them"""
+        stem = job.model[:-len('.ser.gz')] if job.model.endswith('.ser.gz') else job.model
+        return sorted(glob.glob(os.path.join(self.models_dir, stem + '-*.ser.gz')))
+
+    def _fits(self, job, cpus, memory_mb, running):
+        if not running:
+            return True
+        return job.threads <= cpus and job.memory_mb <= memory_mb
+
+    def _start(self, job):
+        job_dir = os.path.join(self.jobs_dir, job.name)
+        if not os.path.isdir(job_dir):
+            os.makedirs(job_dir)
+        if os.path.isfile(self._state_path(job)):
+            os.remove(self._state_path(job))
+        # checkpoints of an interrupted run would mix with the ones of this run
+        for path in self.checkpoints(job):
+            os.remove(path)
+        if not os.path.isdir(self.models_dir):
+            os.makedirs(self.models_dir)
+        with open(os.path.join(job_dir, 'train.log'), 'wb') as log:
+            process = subprocess.Popen(self._args(job), cwd=self.cwd, stdout=log, stderr=subprocess.STDOUT)
+        print("Started training job %s (%d CPUs, %d MB)" % (job.name, job.threads, job.memory_mb))
+        return process
+
+    def _finish(self, job, process, start):
+        state = {
+            'status': 'done' if process.returncode == 0 else 'failed',
+            'returncode': process.returncode,
+            'seconds': time.time() - start,
+            'args': self._args(job),
+            'model': job.model,
+            'checkpoints': [os.path.basename(path) for path in self.checkpoints(job)],
+        }
+        # replaced in one rename, so a crash never leaves a job half marked as done
+        tmp_path = self._state_path(job) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.rename(tmp_path, self._state_path(job))
+        print("Training job %s %s after %.0f s" % (job.name, state['status'], state['seconds']))
+        return state
+
+    def run(self, jobs):
+        """Runs every job that is not done yet and returns {job name: job.json state} of all jobs"""
+        states = {}
+        pending = []
+        for job in jobs:
+            if self.is_done(job):
+                print("Training job %s is done already" % job.name)
+                states[job.name] = self.state(job)
+            else:
+                pending.append(job)
+
+        running = []
+        cpus = self.cpus
+        memory_mb = self.memory_mb
+        try:
+            while pending or running:
+                for job in list(pending):
+                    if self._fits(job, cpus, memory_mb, running):
+                        running.append((job, self._start(job), time.time()))
+                        pending.remove(job)
+                        cpus -= job.threads
+                        memory_mb -= job.memory_mb
+                time.sleep(self.poll_interval)
+                for job, process, start in list(running):
+                    if process.poll() is not None:
+                        states[job.name] = self._finish(job, process, start)
+                        running.remove((job, process, start))
+                        cpus += job.threads
+                        memory_mb += job.memory_mb
+        finally:
+            # an interrupted scheduler leaves no training behind, those jobs rerun on the next start
+            for job, process, _ in running:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+        return states
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='training',
+                                     description='Trains the fold sentiment models, as many at once as fit the machine')
+    parser.add_argument('--folds', type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument('--train-pattern', default='../corenlp/binary/binary_train_%d',
+                        help='binarized train set of a fold, %%d is the fold number')
+    parser.add_argument('--dev', default='../corenlp/dev.txt')
+    parser.add_argument('--epochs', type=int, nargs='+', default=[10])
+    parser.add_argument('--num-hid', type=int, nargs='+', default=[25])
+    parser.add_argument('--threads', type=int, default=8, help='SentimentTraining -nthreads of every job')
+    parser.add_argument('--heap', default='10g', help='maximum heap of every job')
+    parser.add_argument('--cpus', type=int, default=None, help='CPU budget, all CPUs by default')
+    parser.add_argument('--memory', default=None, help='memory budget such as 60g, all physical memory by default')
+    args = parser.parse_args()
+
+    jobs = grid_jobs(args.train_pattern, args.dev, args.folds, args.epochs, args.num_hid, args.threads, args.heap)
+    memory_mb = heap_megabytes(args.memory) if args.memory else None
+    states = TrainingScheduler(args.cpus, memory_mb).run(jobs)
+    print("%-16s %8s %10s %12s" % ("job", "status", "seconds", "checkpoints"))
+    for job in jobs:
+        state = states[job.name]
+        print("%-16s %8s %10.0f %12d" % (job.name, state['status'], state['seconds'], len(state['checkpoints'])))
+
+
+if __name__ == "__main__":
+    main()
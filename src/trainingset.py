@@ -0,0 +1,116 @@
+import argparse
+import mmap
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from multiprocessing import cpu_count
+
+from corenlp import CORENLP_CLASSPATH, CORENLP_HOME
+
+# the blank line BuildTrainingSet splits its input on into one block per sentence
+BLOCK_SEPARATOR = re.compile(br"\n\s*\n+")
+
+
+def shard_bounds(data, n_shards):
+    """
+    (start, stop) byte ranges that cut data into at most n_shards pieces of about equal size, each cut
+    right after a block separator. BuildTrainingSet splits every piece into the same blocks it finds in
+    the whole file, so the tree output of the pieces, concatenated in order, is the output of the file.
+    """
+    size = len(data)
+    bounds = []
+    start = 0
+    for i in range(1, n_shards):
+        if start >= size:
+            break
+        match = BLOCK_SEPARATOR.search(data, max(start, size * i // n_shards))
+        if match is None:
+            break
+        if match.end() > start:
+            bounds.append((start, match.end()))
+            start = match.end()
+    if start < size or not bounds:
+        bounds.append((start, size))
+    return bounds
+
+
+def write_shards(path, n_shards, shard_dir):
+    """Cuts the train file at path into shard files in shard_dir and returns their paths, in order"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap refuses empty files
+            data = b''
+        else:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        paths = []
+        for i, (start, stop) in enumerate(shard_bounds(data, n_shards)):
+            shard_path = os.path.join(shard_dir, 'shard_%d.txt' % i)
+            with open(shard_path, 'wb') as shard:
+                shard.write(data[start:stop])
+            paths.append(shard_path)
+    return paths
+
+
+def build_training_set(train_set, output, workers=None, heap='4g', parser_model=None, sentiment_model=None,
+                       jvm_args=(), java='java', classpath=CORENLP_CLASSPATH, cwd=CORENLP_HOME):
+    """
+    Runs BuildTrainingSet on train_set with one JVM per shard, workers shards at once, and writes the
+    binarized trees to output in the order of train_set: byte for byte what a single BuildTrainingSet
+    run prints. Every worker gets its own heap, so the machine needs workers times heap of memory.
+    """
+    workers = workers or cpu_count()
+    shard_dir = tempfile.mkdtemp(prefix='trainingset', dir=os.path.dirname(os.path.abspath(output)))
+    processes = []
+    try:
+        shards = write_shards(train_set, workers, shard_dir)
+        for shard in shards:
+            name = os.path.splitext(shard)[0]
+            args = [java, '-mx' + heap] + list(jvm_args) + ['-cp', classpath, 'BuildTrainingSet',
+                                                           '-input', os.path.abspath(shard)]
+            if parser_model is not None:
+                args += ['-parserModel', parser_model]
+            if sentiment_model is not None:
+                args += ['-sentimentModel', sentiment_model]
+            with open(name + '.trees', 'wb') as out, open(name + '.log', 'wb') as log:
+                processes.append((name, args, subprocess.Popen(args, cwd=cwd, stdout=out, stderr=log)))
+
+        for name, args, process in processes:
+            status = process.wait()
+            if status != 0:
+                with open(name + '.log', 'rb') as log:
+                    tail = log.read()[-2000:].decode('utf-8', 'replace')
+                raise subprocess.CalledProcessError(status, args, tail)
+
+        # written under a temporary name first, so a failed merge never leaves a truncated training set
+        tmp_output = output + '.tmp'
+        with open(tmp_output, 'wb') as out:
+            for name, _, _ in processes:
+                with open(name + '.trees', 'rb') as trees:
+                    shutil.copyfileobj(trees, out)
+        os.rename(tmp_output, output)
+    finally:
+        for _, _, process in processes:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        shutil.rmtree(shard_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='trainingset',
+                                     description='Builds a binarized CoreNLP training set with parallel BuildTrainingSet workers')
+    parser.add_argument('train_set', help='train_set*.txt written by Sentiment.py')
+    parser.add_argument('output', help='binarized training set, e.g. ../corenlp/binary/binary_train_0')
+    parser.add_argument('--workers', type=int, default=None, help='BuildTrainingSet JVMs, one per CPU by default')
+    parser.add_argument('--heap', default='4g', help='maximum heap of every JVM')
+    parser.add_argument('--parser-model', default=None)
+    parser.add_argument('--sentiment-model', default=None, help='model to prelabel the sentences with')
+    args = parser.parse_args()
+
+    build_training_set(args.train_set, args.output, args.workers, args.heap, args.parser_model, args.sentiment_model)
+
+
+if __name__ == "__main__":
+    main()
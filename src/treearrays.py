@@ -0,0 +1,60 @@
+import io
+import json
+import os
+
+import numpy as np
+
+
+def _map(path, dtype, columns, rows):
+    if rows == 0 or columns == 0:
+        # mmap refuses empty files
+        return np.zeros((rows, columns), dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(rows, columns))
+
+
+class TreeArrays:
+    """
+    The sentiment trees LEGOClassifier -stdin -binaryOutput prefix wrote, memory-mapped: nodes is an int32
+    (nodes x 5) array of sentence, parent (-1 for roots), predicted class and the [begin, end) token span of
+    every node; probabilities and vectors are the float32 (nodes x classes) and (nodes x hidden) matrices in
+    the same node order. Nodes of a sentence are contiguous, its root first.
+    """
+    def __init__(self, prefix):
+        with open(prefix + '.json', 'r') as f:
+            self.header = json.load(f)
+        n_nodes = self.header['nodes']
+        # LEGOClassifier writes little endian, whatever the byte order of this machine
+        self.nodes = _map(prefix + '.nodes', np.dtype('<i4'), len(self.header['node_columns']), n_nodes)
+        self.probabilities = _map(prefix + '.probabilities', np.dtype('<f4'), self.header['classes'], n_nodes)
+        self.vectors = _map(prefix + '.vectors', np.dtype('<f4'), self.header['hidden'], n_nodes)
+        self.prefix = prefix
+        self._sentences = None
+
+    def __len__(self):
+        return self.header['sentences']
+
+    def column(self, name):
+        return self.nodes[:, self.header['node_columns'].index(name)]
+
+    @property
+    def roots(self):
+        """Node index of the root of every sentence"""
+        return np.flatnonzero(self.column('parent') == -1)
+
+    @property
+    def sentences(self):
+        """Text of every sentence, read on first use"""
+        if self._sentences is None:
+            path = self.prefix + '.sentences.txt'
+            if os.path.isfile(path):
+                with io.open(path, 'r', encoding='utf-8') as f:
+                    self._sentences = [line.rstrip(u'\n') for line in f]
+            else:
+                self._sentences = []
+        return self._sentences
+
+    def sentence_nodes(self, i):
+        """Slice of the nodes of sentence i"""
+        roots = self.roots
+        stop = roots[i + 1] if i + 1 < len(roots) else self.nodes.shape[0]
+        return slice(roots[i], stop)
@@ -1 +1,10 @@
-from uclassify import uclassify
+from .uclassify import uclassify
+from .uclassify_cache import ResponseCache
+try:
+    from .uclassify_local import LocalUclassify
+except ImportError as e:
+    # LocalUclassify needs numpy and scipy, the API clients do not; without them it fails when it is used
+    _localImportError = str(e)
+
+    def LocalUclassify(*args, **kwargs):
+        raise ImportError("LocalUclassify is unavailable: %s" % _localImportError)
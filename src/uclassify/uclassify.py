@@ -25,16 +25,41 @@
 
 from xml.dom.minidom import Document
 from time import gmtime, strftime
-from uclassify_eh import uClassifyError
+from .uclassify_eh import uClassifyError
+from . import uclassify_xml
 import xml.dom.minidom
 import requests
-import base64
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from multiprocessing.pool import ThreadPool
+import hashlib
+import json
 
 class uclassify:
-    def __init__(self):
+    def __init__(self,pool_size=10,max_retries=3,backoff_factor=0.5,timeout=60,session=None,
+                 batch_size=500,batch_bytes=2 * 1024 * 1024,parallel_batches=4):
+        """
+           :param pool_size: (optional) Number of kept-alive connections to the API, i.e. threads that can share this client without waiting.
+           :param max_retries: (optional) Retries on connection errors and on 503 replies, with exponential backoff.
+           :param backoff_factor: (optional) Seconds of the first backoff, doubled on every retry.
+           :param timeout: (optional) Seconds to wait for the server to connect and to answer.
+           :param session: (optional) requests.Session to share with other clients instead of creating one.
+           :param batch_size: (optional) Maximum number of texts sent in one train/untrain/classify request.
+           :param batch_bytes: (optional) Maximum encoded payload bytes of one such request.
+           :param parallel_batches: (optional) Number of batches of one call that are sent concurrently, at most the connection pool size.
+        """
         self.api_url = "https://api.uclassify.com"
         self.writeApiKey=None
         self.readApiKey=None
+        self.timeout = timeout
+        self.session = session if session is not None else self._buildSession(pool_size,max_retries,backoff_factor)
+        self.cache=None
+        self._classifierStates = {}
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        # more batches in flight than pooled connections would only queue for a connection
+        adapter = self.session.get_adapter(self.api_url)
+        self.parallel_batches = min(parallel_batches, getattr(adapter, '_pool_maxsize', pool_size))
 
     def setWriteApiKey(self,key):
         self.writeApiKey = key
@@ -42,6 +67,127 @@ class uclassify:
     def setReadApiKey(self,key):
         self.readApiKey = key
 
+    @staticmethod
+    def _buildSession(pool_size,max_retries,backoff_factor):
+        # Every call, write calls included, is a POST to the same URL, so only requests the server cannot have
+        # applied are resent: those that never reached it and 503 replies. A 502 or 504 may come from a proxy
+        # that gave up while the server went on to apply a train call.
+        options = dict(total=max_retries, connect=max_retries, read=0, backoff_factor=backoff_factor,
+                       status_forcelist=(503,), raise_on_status=False)
+        try:
+            retry = Retry(allowed_methods=None, **options)
+        except TypeError:
+            # urllib3 before 1.26 names the option method_whitelist, which 2.x no longer accepts
+            retry = Retry(method_whitelist=False, **options)
+        # Threads beyond pool_size, e.g. folds times parallel_batches, wait for a pooled connection instead of
+        # opening throwaway ones.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _post(self,data,stream=False):
+        r = self.session.post(self.api_url,data,timeout=self.timeout,stream=stream)
+        if stream:
+            r.raw.decode_content = True
+        return r
+
+    def close(self):
+        self.session.close()
+
+    def _batches(self,texts):
+        """Splits texts into consecutive batches bounded by text count and encoded payload bytes."""
+        return uclassify_xml.iter_batches(texts,self.batch_size,self.batch_bytes)
+
+    def _sendBatch(self,sendfn,batch):
+        """Sends one batch, halving it for as long as the server rejects it as too large."""
+        try:
+            result = sendfn(batch)
+        except uClassifyError as e:
+            if str(e.error_code) != "4013" or len(batch) == 1:
+                raise
+            half = len(batch) // 2
+            return self._sendBatch(sendfn, batch[:half]) + self._sendBatch(sendfn, batch[half:])
+        return result if result is not None else []
+
+    def _sendBatches(self,sendfn,texts):
+        """Sends texts in batches, up to parallel_batches at a time, and concatenates the results in input order."""
+        batches = list(self._batches(texts))
+        if len(batches) <= 1 or self.parallel_batches <= 1:
+            results = [self._sendBatch(sendfn, batch) for batch in batches]
+        else:
+            pool = ThreadPool(min(self.parallel_batches, len(batches)))
+            try:
+                results = pool.map(lambda batch: self._sendBatch(sendfn, batch), batches)
+            finally:
+                pool.close()
+                pool.join()
+        return [item for result in results for item in result]
+
+    def setCache(self,cache):
+        """Consults a ResponseCache before sending texts to classify and classifyKeywords.
+           :param cache: (required) ResponseCache instance, or None to disable caching.
+        """
+        self.cache = cache
+
+    def _updateClassifierState(self,classifierName,*operation):
+        """Chains a digest of the write calls made to a classifier through this client.
+           Classifiers trained identically share a state, so their cached results are interchangeable.
+           A classifier written to without being created here has an unknown state and is not cached.
+        """
+        if operation[0] == "create":
+            state = hashlib.sha1(b"create")
+        elif operation[0] == "remove":
+            self._classifierStates[classifierName] = None
+            return
+        elif self._classifierStates.get(classifierName) is None:
+            self._classifierStates[classifierName] = None
+            return
+        else:
+            state = hashlib.sha1(self._classifierStates[classifierName].encode('utf-8'))
+        for part in operation:
+            if not isinstance(part, bytes):
+                part = part.encode('utf-8')
+            state.update(b"\0" + part)
+        self._classifierStates[classifierName] = state.hexdigest()
+
+    def _writeCall(self,classifierName,operation,callfn):
+        """Runs a write call and chains operation into the classifier state once the call succeeded.
+           A failed call may have been applied in part, so the classifier is not cached from then on.
+        """
+        try:
+            result = callfn()
+        except:
+            self._classifierStates[classifierName] = None
+            raise
+        self._updateClassifierState(classifierName, *operation)
+        return result
+
+    def _sendWrite(self,data):
+        """POSTs a write request and raises uClassifyError unless the server applied it."""
+        r = self._post(data)
+        if r.status_code == 200:
+            success, status_code, text = self._getResponseCode(r.content)
+            if success == "false":
+                raise uClassifyError(text,status_code)
+        else:
+            raise uClassifyError("Bad XML Request Sent")
+
+    def _textsDigest(self,texts):
+        digest = hashlib.sha1()
+        for text in texts:
+            if not isinstance(text, bytes):
+                text = text.encode('utf-8')
+            digest.update(hashlib.sha1(text).digest())
+        return digest.hexdigest()
+
+    def _classifierIdentity(self,classifierName,username):
+        """Returns the cache identity of a classifier, or None if its results must not be cached."""
+        if classifierName in self._classifierStates:
+            return self._classifierStates[classifierName]
+        return "%s/%s" % (username or "", classifierName)
+
     def _buildbasicXMLdoc(self):
         doc = Document()
         root_element = doc.createElementNS('http://api.uclassify.com/1/RequestSchema', 'uclassify')
@@ -76,72 +222,31 @@ class uclassify:
         """Creates a new classifier.
            :param classifierName: (required) The Classifier Name you are going to create.
         """
-        doc,root_element = self._buildbasicXMLdoc()
-        writecalls = doc.createElement("writeCalls")
-        writecalls.setAttribute("writeApiKey",self.writeApiKey) #Add exception handling here
-        writecalls.setAttribute("classifierName",classifierName)
-        create = doc.createElement("create")
+        if self.writeApiKey == None:
+            raise uClassifyError("Write API Key not Initialized")
         cur_time = strftime("%Y%m%d%H%M", gmtime())
-        create.setAttribute("id",cur_time + "create" + classifierName)
-        root_element.appendChild(writecalls)
-        writecalls.appendChild(create)
-        r = requests.post(self.api_url,doc.toxml())
-        if r.status_code == 200:
-            success, status_code, text = self._getResponseCode(r.content)
-            if success == "false":
-                raise uClassifyError(text,status_code)
-        else:
-            raise uClassifyError("Bad XML Request Sent")
+        data = uclassify_xml.build_create(self.writeApiKey,classifierName,cur_time)
+        self._writeCall(classifierName, ("create",), lambda: self._sendWrite(data))
 
     def addClass(self,className,classifierName):
         """Adds class to an existing Classifier.
            :param className: (required) A List containing various classes that has to be added for the given Classifier.
            :param classifierName: (required) Classifier where the classes will be added to.
         """
-        doc, root_element = self._buildbasicXMLdoc()
-        writecalls = doc.createElement("writeCalls")
         if self.writeApiKey == None:
             raise uClassifyError("Write API Key not Initialized")
-        writecalls.setAttribute("writeApiKey",self.writeApiKey)
-        writecalls.setAttribute("classifierName",classifierName)
-        root_element.appendChild(writecalls)
-        for clas in className:
-            addclass = doc.createElement("addClass")
-            addclass.setAttribute("id","AddClass" + clas)
-            addclass.setAttribute("className",clas)
-            writecalls.appendChild(addclass)
-        r = requests.post(self.api_url,doc.toxml())
-        if r.status_code == 200:
-            success, status_code, text = self._getResponseCode(r.content)
-            if success == "false":
-                raise uClassifyError(text,status_code)
-        else:
-            raise uClassifyError("Bad XML Request Sent")
+        data = uclassify_xml.build_class_calls(b"addClass","AddClass",self.writeApiKey,className,classifierName)
+        self._writeCall(classifierName, ("addClass",) + tuple(className), lambda: self._sendWrite(data))
     
     def removeClass(self,className,classifierName):
         """Removes class from an existing Classifier.
            :param className: (required) A List containing various classes that will be removed from the given Classifier.
            :param classifierName: (required) Classifier
         """
-        doc, root_element = self._buildbasicXMLdoc()
-        writecalls = doc.createElement("writeCalls")
         if self.writeApiKey == None:
             raise uClassifyError("Write API Key not Initialized")
-        writecalls.setAttribute("writeApiKey",self.writeApiKey)
-        writecalls.setAttribute("classifierName",classifierName)
-        root_element.appendChild(writecalls)
-        for clas in className:
-            addclass = doc.createElement("removeClass")
-            addclass.setAttribute("id","removeClass" + clas)
-            addclass.setAttribute("className",clas)
-            writecalls.appendChild(addclass)
-        r = requests.post(self.api_url,doc.toxml())
-        if r.status_code == 200:
-            success, status_code, text = self._getResponseCode(r.content)
-            if success == "false":
-                raise uClassifyError(text,status_code)
-        else:
-            raise uClassifyError("Bad XML Request Sent")
+        data = uclassify_xml.build_class_calls(b"removeClass","removeClass",self.writeApiKey,className,classifierName)
+        self._writeCall(classifierName, ("removeClass",) + tuple(className), lambda: self._sendWrite(data))
     
     def train(self,texts,className,classifierName):
         """Performs training on a single classs.
@@ -149,39 +254,14 @@ class uclassify:
            :param className: (required) Name of the class that needs to be trained.
            :param classifierName: (required) Name of the Classifier
         """
-        base64texts = []
-        for text in texts:
-            base64_text = base64.b64encode(text) #For Python version 3, need to change.
-            base64texts.append(base64_text)
-        doc,root_element = self._buildbasicXMLdoc()
-        textstag = doc.createElement("texts")
-        writecalls = doc.createElement("writeCalls")
+        self._writeCall(classifierName, ("train", className, self._textsDigest(texts)),
+                        lambda: self._sendBatches(lambda batch: self._train(batch, className, classifierName), texts))
+
+    def _train(self,texts,className,classifierName):
         if self.writeApiKey == None:
             raise uClassifyError("Write API Key not Initialized")
-        writecalls.setAttribute("writeApiKey",self.writeApiKey)
-        writecalls.setAttribute("classifierName",classifierName)
-        root_element.appendChild(textstag)
-        root_element.appendChild(writecalls)
-        counter = 1
-        for text in base64texts:
-            textbase64 = doc.createElement("textBase64")
-            traintag = doc.createElement("train")
-            textbase64.setAttribute("id",className + "Text" + str(counter))
-            ptext = doc.createTextNode(text)
-            textbase64.appendChild(ptext)
-            textstag.appendChild(textbase64)
-            traintag.setAttribute("id","Train"+className+ str(counter))
-            traintag.setAttribute("className",className)
-            traintag.setAttribute("textId",className + "Text" + str(counter))
-            counter = counter + 1
-            writecalls.appendChild(traintag)
-        r = requests.post(self.api_url,doc.toxml())
-        if r.status_code == 200:
-            success, status_code, text = self._getResponseCode(r.content)
-            if success == "false":
-                raise uClassifyError(text,status_code)
-        else:
-            raise uClassifyError("Bad XML Request Sent")
+        data = uclassify_xml.build_train(b"train","Train",self.writeApiKey,texts,className,classifierName)
+        self._sendWrite(data)
 
     def untrain(self,texts,className,classifierName):
         """Performs untraining on text for a specific class.
@@ -189,39 +269,46 @@ class uclassify:
            :param className: (required) Name of the class.
            :param classifierName: (required) Name of the Classifier
         """
-        base64texts = []
-        for text in texts:
-            base64_text = base64.b64encode(text) #For Python version 3, need to change.
-            base64texts.append(base64_text)
-        doc,root_element = self._buildbasicXMLdoc()
-        textstag = doc.createElement("texts")
-        writecalls = doc.createElement("writeCalls")
+        self._writeCall(classifierName, ("untrain", className, self._textsDigest(texts)),
+                        lambda: self._sendBatches(lambda batch: self._untrain(batch, className, classifierName), texts))
+
+    def _untrain(self,texts,className,classifierName):
         if self.writeApiKey == None:
             raise uClassifyError("Write API Key not Initialized")
-        writecalls.setAttribute("writeApiKey",self.writeApiKey)
-        writecalls.setAttribute("classifierName",classifierName)
-        root_element.appendChild(textstag)
-        root_element.appendChild(writecalls)
-        counter = 1
-        for text in base64texts:
-            textbase64 = doc.createElement("textBase64")
-            traintag = doc.createElement("untrain")
-            textbase64.setAttribute("id",className + "Text" + str(counter))
-            ptext = doc.createTextNode(text)
-            textbase64.appendChild(ptext)
-            textstag.appendChild(textbase64)
-            traintag.setAttribute("id","Untrain"+className+ str(counter))
-            traintag.setAttribute("className",className)
-            traintag.setAttribute("textId",className + "Text" + str(counter))
-            counter = counter + 1
-            writecalls.appendChild(traintag)
-        r = requests.post(self.api_url,doc.toxml())
-        if r.status_code == 200:
-            success, status_code, text = self._getResponseCode(r.content)
-            if success == "false":
-                raise uClassifyError(text,status_code)
-        else:
-            raise uClassifyError("Bad XML Request Sent")
+        data = uclassify_xml.build_train(b"untrain","Untrain",self.writeApiKey,texts,className,classifierName)
+        self._sendWrite(data)
+
+    def _checkedResults(self,call,texts,results):
+        """Fails when the server answered with a result count other than the number of texts sent,
+           before any of the results get cached under the wrong text.
+        """
+        if len(results) != len(texts):
+            raise uClassifyError("%s returned %d results for %d texts" % (call, len(results), len(texts)))
+        return results
+
+    def _cachedClassify(self,call,texts,classifierName,username,classifyfn):
+        """Serves texts from the cache and sends only the missing ones to classifyfn, in batches."""
+        classifier = None if self.cache is None else self._classifierIdentity(classifierName, username)
+        sendfn = lambda batch: classifyfn(batch, classifierName, username)
+        if classifier is None:
+            return self._checkedResults(call, texts, self._sendBatches(sendfn, texts))
+        keys = [self.cache.key(self.api_url + "/" + call, classifier, text) for text in texts]
+        cached = self.cache.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        result = [None] * len(texts)
+        if missing:
+            sent = [texts[i] for i in missing]
+            fresh = self._checkedResults(call, sent, self._sendBatches(sendfn, sent))
+            values = {}
+            for i, (_, text_coverage, cresult) in zip(missing, fresh):
+                result[i] = (texts[i], text_coverage, cresult)
+                values[keys[i]] = json.dumps([text_coverage, cresult]).encode('utf-8')
+            self.cache.put_many(values)
+        for i, key in enumerate(keys):
+            if result[i] is None:
+                text_coverage, cresult = json.loads(cached[key].decode('utf-8'))
+                result[i] = (texts[i], text_coverage, [tuple(tup) for tup in cresult])
+        return result
 
     def classify(self,texts,classifierName,username = None):
         """Performs classification on texts.
@@ -229,64 +316,33 @@ class uclassify:
            :param classifierName: (required) Classifier Name
            :param username: (optional): Name of the user, under whom the classifier exists.
         """
-        doc,root_element = self._buildbasicXMLdoc()
-        textstag = doc.createElement("texts")
-        readcalls = doc.createElement("readCalls")
+        return self._cachedClassify("classify", texts, classifierName, username, self._classify)
+
+    def _classify(self,texts,classifierName,username = None):
+        """Performs classification on texts.
+           :param texts: (required) A List of texts that needs to be classified.
+           :param classifierName: (required) Classifier Name
+           :param username: (optional): Name of the user, under whom the classifier exists.
+        """
         if self.readApiKey == None:
             raise uClassifyError("Read API Key not Initialized")
-        readcalls.setAttribute("readApiKey",self.readApiKey)
-        root_element.appendChild(textstag)
-        root_element.appendChild(readcalls)
-        base64texts = []
-        for text in texts:
-            base64_text = base64.b64encode(text) #For Python version 3, need to change.
-            base64texts.append(base64_text)
-        counter = 1
-        for text in base64texts:
-            textbase64 = doc.createElement("textBase64")
-            classifytag = doc.createElement("classify")
-            textbase64.setAttribute("id","Classifytext"+ str(counter))
-            ptext = doc.createTextNode(text)
-            textbase64.appendChild(ptext)
-            classifytag.setAttribute("id","Classify"+ str(counter))
-            classifytag.setAttribute("classifierName",classifierName)
-            classifytag.setAttribute("textId","Classifytext"+str(counter))
-            if username != None:
-                classifytag.setAttribute("username",username)
-            textstag.appendChild(textbase64)
-            readcalls.appendChild(classifytag)
-            counter = counter + 1
-        r = requests.post(self.api_url,doc.toxml())
-        if r.status_code == 200:
-            success, status_code, text = self._getResponseCode(r.content)
-            if success == "false":
-                raise uClassifyError(text,status_code)
+        data = uclassify_xml.build_classify(b"classify",self.readApiKey,texts,classifierName,username)
+        r = self._post(data,stream=True)
+        try:
+            if r.status_code == 200:
+                return self.parseClassifyResponse(r.raw,texts)
             else:
-                return self.parseClassifyResponse(r.content,texts)
-        else:
-            raise uClassifyError("Bad XML Request Sent")
+                raise uClassifyError("Bad XML Request Sent")
+        finally:
+            r.close()
 
     def parseClassifyResponse(self,content,texts):
-        """Parses the Classifier response from the server.
-           :param content: (required) XML Response from server.
+        """Parses the Classifier response from the server, checking its status in the same pass.
+           :param content: (required) XML Response from server, as bytes or a file-like object.
+           :param texts: (required) The classified texts, in request order.
         """
-        counter = 0
-        doc = xml.dom.minidom.parseString(content)
-        node = doc.documentElement
-        result = []
-        classifytags = node.getElementsByTagName("classification")
-        for classi in classifytags:
-            text_coverage = classi.getAttribute("textCoverage")
-            classtags = classi.getElementsByTagName("class")
-            cresult = []
-            for ctag in classtags:
-                classname = ctag.getAttribute("className")
-                cper = ctag.getAttribute("p")
-                tup = (classname,cper)
-                cresult.append(tup)
-            result.append((texts[counter],text_coverage,cresult))
-            counter = counter + 1
-        return result
+        return [(texts[text_index],text_coverage,cresult)
+                for text_index, text_coverage, cresult in uclassify_xml.iter_classify_response(content)]
             
     def classifyKeywords(self,texts,classifierName,username = None):
         """Performs classification on texts.
@@ -294,42 +350,25 @@ class uclassify:
            :param classifierName: (required) Classifier Name
            :param username: (optional): Name of the user, under whom the classifier exists.
         """
-        doc,root_element = self._buildbasicXMLdoc()
-        textstag = doc.createElement("texts")
-        readcalls = doc.createElement("readCalls")
+        return self._cachedClassify("classifyKeywords", texts, classifierName, username, self._classifyKeywords)
+
+    def _classifyKeywords(self,texts,classifierName,username = None):
+        """Performs classification on texts.
+           :param texts: (required) A List of texts that needs to be classified.
+           :param classifierName: (required) Classifier Name
+           :param username: (optional): Name of the user, under whom the classifier exists.
+        """
         if self.readApiKey == None:
             raise uClassifyError("Read API Key not Initialized")
-        readcalls.setAttribute("readApiKey",self.readApiKey)
-        root_element.appendChild(textstag)
-        root_element.appendChild(readcalls)
-        base64texts = []
-        for text in texts:
-            base64_text = base64.b64encode(text) #For Python version 3, need to change.
-            base64texts.append(base64_text)
-        counter = 1
-        for text in base64texts:
-            textbase64 = doc.createElement("textBase64")
-            classifytag = doc.createElement("classifyKeywords")
-            textbase64.setAttribute("id","Classifytext"+ str(counter))
-            ptext = doc.createTextNode(text)
-            textbase64.appendChild(ptext)
-            classifytag.setAttribute("id","Classify"+ str(counter))
-            classifytag.setAttribute("classifierName",classifierName)
-            classifytag.setAttribute("textId","Classifytext"+str(counter))
-            if username != None:
-                classifytag.setAttribute("username",username)
-            textstag.appendChild(textbase64)
-            readcalls.appendChild(classifytag)
-            counter = counter + 1
-        r = requests.post(self.api_url,doc.toxml())
-        if r.status_code == 200:
-            success, status_code, text = self._getResponseCode(r.content)
-            if success == "false":
-                raise uClassifyError(text,status_code)
+        data = uclassify_xml.build_classify(b"classifyKeywords",self.readApiKey,texts,classifierName,username)
+        r = self._post(data,stream=True)
+        try:
+            if r.status_code == 200:
+                return self.parseClassifyResponse(r.raw,texts)
             else:
-                return self.parseClassifyResponse(r.content,texts)
-        else:
-            raise uClassifyError("Bad XML Request Sent")
+                raise uClassifyError("Bad XML Request Sent")
+        finally:
+            r.close()
         
         def parseClassifyKeywordResponse(self,content,texts):
             """Parses the Classifier response from the server.
@@ -365,61 +404,21 @@ class uclassify:
         """Returns Information about the Classifier in a List.
            :param classifierName: (required) Classifier Name
         """
-        doc,root_element = self._buildbasicXMLdoc()
-        readcalls = doc.createElement("readCalls")
         if self.readApiKey == None:
             raise uClassifyError("Read API Key not Initialized")
-        readcalls.setAttribute("readApiKey",self.readApiKey)
-        root_element.appendChild(readcalls)
-        getinfotag = doc.createElement("getInformation")
-        getinfotag.setAttribute("id","GetInformation")
-        getinfotag.setAttribute("classifierName",classifierName)
-        readcalls.appendChild(getinfotag)
-        r = requests.post(self.api_url,doc.toxml())
+        data = uclassify_xml.build_get_information(self.readApiKey,classifierName)
+        r = self._post(data)
         if r.status_code == 200:
-            success, status_code, text = self._getResponseCode(r.content)
-            if success == "false":
-                raise uClassifyError(text,status_code)
-            else:
-                return self._parseClassifierInformation(r.content)
+            return uclassify_xml.parse_class_information(r.content)
         else:
             raise uClassifyError("Bad XML Request Sent")
-        
-    def _parseClassifierInformation(self,content):
-        doc = xml.dom.minidom.parseString(content)
-        node = doc.documentElement
-        classinfo = node.getElementsByTagName("classInformation")
-        result = []
-        for classes in classinfo:
-            cname = classes.getAttribute("className")
-            uf = classes.getElementsByTagName("uniqueFeatures")
-            tc = classes.getElementsByTagName("totalCount")
-            for uniquef in uf:
-                uf_data = uniquef.firstChild.data
-            for totalc in tc:
-                tc_data = totalc.firstChild.data
-            result.append((cname,uf_data,tc_data))
-        return result
 
     def removeClassifier(self,classifierName):
         """Removes Classifier.
            :param classifierName(required): Classifier Name
         """
-        doc,root_element = self._buildbasicXMLdoc()
-        writecalls = doc.createElement("writeCalls")
         if self.writeApiKey == None:
             raise uClassifyError("Write API Key not Initialized")
-        writecalls.setAttribute("writeApiKey",self.writeApiKey)
-        writecalls.setAttribute("classifierName",classifierName)
-        removetag = doc.createElement("remove")
-        removetag.setAttribute("id","Remove")
-        root_element.appendChild(writecalls)
-        writecalls.appendChild(removetag)
-        r = requests.post(self.api_url,doc.toxml())
-        if r.status_code == 200:
-            success, status_code, text = self._getResponseCode(r.content)
-            if success == "false":
-                raise uClassifyError(text,status_code)
-        else:
-            raise uClassifyError("Bad XML Request Sent")
+        data = uclassify_xml.build_remove_classifier(self.writeApiKey,classifierName)
+        self._writeCall(classifierName, ("remove",), lambda: self._sendWrite(data))
 
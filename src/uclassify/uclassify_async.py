@@ -0,0 +1,204 @@
+# asyncio flavour of the uclassify client. Python 3 only, needs aiohttp:
+#   from uclassify.uclassify_async import AsyncUclassify
+
+import asyncio
+from time import gmtime, strftime
+
+import aiohttp
+
+from .uclassify_eh import uClassifyError
+from . import uclassify_xml
+
+
+class AsyncUclassify:
+    """
+       uclassify client for asyncio programs. Requests are built and responses parsed by the same
+       uclassify_xml core as the blocking client; calls share one pooled aiohttp session, so any
+       number of them can be awaited concurrently.
+    """
+    def __init__(self,pool_size=10,max_retries=3,backoff_factor=0.5,timeout=60,session=None,
+                 batch_size=500,batch_bytes=2 * 1024 * 1024):
+        """
+           :param pool_size: (optional) Number of kept-alive connections to the API; further requests wait for a free one.
+           :param max_retries: (optional) Retries on connection errors and on 503 replies, with exponential backoff.
+           :param backoff_factor: (optional) Seconds of the first backoff, doubled on every retry.
+           :param timeout: (optional) Seconds one request may take in total.
+           :param session: (optional) aiohttp.ClientSession to share with other clients instead of creating one.
+           :param batch_size: (optional) Maximum number of texts sent in one train/untrain/classify request.
+           :param batch_bytes: (optional) Maximum encoded payload bytes of one such request.
+        """
+        self.api_url = "https://api.uclassify.com"
+        self.writeApiKey=None
+        self.readApiKey=None
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.session = session
+        self._ownsSession = session is None
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+
+    def setWriteApiKey(self,key):
+        self.writeApiKey = key
+
+    def setReadApiKey(self,key):
+        self.readApiKey = key
+
+    def _getSession(self):
+        # created on first use, so that it belongs to the running event loop
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size)
+            self.session = aiohttp.ClientSession(connector=connector,
+                                                 timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.session
+
+    async def close(self):
+        if self._ownsSession and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self,etype,value,traceback):
+        await self.close()
+
+    async def _post(self,data,parse):
+        """POSTs a request and returns parse(response bytes).
+           Only requests the server cannot have applied are resent, those that never reached it and 503 replies:
+           a 502 or 504 may come from a proxy that gave up while the server went on to apply a write call.
+        """
+        session = self._getSession()
+        attempt = 0
+        while True:
+            try:
+                async with session.post(self.api_url, data=data) as r:
+                    if r.status == 200:
+                        return parse(await r.read())
+                    if r.status != 503 or attempt >= self.max_retries:
+                        raise uClassifyError("Bad XML Request Sent")
+            except aiohttp.ClientConnectorError:
+                if attempt >= self.max_retries:
+                    raise
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+            attempt += 1
+
+    async def _sendBatch(self,sendfn,batch):
+        """Sends one batch, halving it for as long as the server rejects it as too large."""
+        try:
+            result = await sendfn(batch)
+        except uClassifyError as e:
+            if str(e.error_code) != "4013" or len(batch) == 1:
+                raise
+            half = len(batch) // 2
+            first, second = await asyncio.gather(self._sendBatch(sendfn, batch[:half]),
+                                                 self._sendBatch(sendfn, batch[half:]))
+            return first + second
+        return result if result is not None else []
+
+    async def _sendBatches(self,sendfn,texts):
+        """Sends all batches of texts concurrently and concatenates the results in input order."""
+        batches = uclassify_xml.iter_batches(texts,self.batch_size,self.batch_bytes)
+        results = await asyncio.gather(*[self._sendBatch(sendfn, batch) for batch in batches])
+        return [item for result in results for item in result]
+
+    def _checkWriteKey(self):
+        if self.writeApiKey == None:
+            raise uClassifyError("Write API Key not Initialized")
+
+    def _checkReadKey(self):
+        if self.readApiKey == None:
+            raise uClassifyError("Read API Key not Initialized")
+
+    async def create(self,classifierName):
+        """Creates a new classifier.
+           :param classifierName: (required) The Classifier Name you are going to create.
+        """
+        self._checkWriteKey()
+        cur_time = strftime("%Y%m%d%H%M", gmtime())
+        data = uclassify_xml.build_create(self.writeApiKey,classifierName,cur_time)
+        await self._post(data, uclassify_xml.check_status)
+
+    async def addClass(self,className,classifierName):
+        """Adds class to an existing Classifier.
+           :param className: (required) A List containing various classes that has to be added for the given Classifier.
+           :param classifierName: (required) Classifier where the classes will be added to.
+        """
+        self._checkWriteKey()
+        data = uclassify_xml.build_class_calls(b"addClass","AddClass",self.writeApiKey,className,classifierName)
+        await self._post(data, uclassify_xml.check_status)
+
+    async def removeClass(self,className,classifierName):
+        """Removes class from an existing Classifier.
+           :param className: (required) A List containing various classes that will be removed from the given Classifier.
+           :param classifierName: (required) Classifier
+        """
+        self._checkWriteKey()
+        data = uclassify_xml.build_class_calls(b"removeClass","removeClass",self.writeApiKey,className,classifierName)
+        await self._post(data, uclassify_xml.check_status)
+
+    async def train(self,texts,className,classifierName):
+        """Performs training on a single classs.
+           :param texts: (required) A List of text used up for training.
+           :param className: (required) Name of the class that needs to be trained.
+           :param classifierName: (required) Name of the Classifier
+        """
+        self._checkWriteKey()
+        await self._sendBatches(lambda batch: self._write(b"train", "Train", batch, className, classifierName), texts)
+
+    async def untrain(self,texts,className,classifierName):
+        """Performs untraining on text for a specific class.
+           :param texts: (required) A List of text used up for training.
+           :param className: (required) Name of the class.
+           :param classifierName: (required) Name of the Classifier
+        """
+        self._checkWriteKey()
+        await self._sendBatches(lambda batch: self._write(b"untrain", "Untrain", batch, className, classifierName), texts)
+
+    async def _write(self,tag,idprefix,texts,className,classifierName):
+        data = uclassify_xml.build_train(tag,idprefix,self.writeApiKey,texts,className,classifierName)
+        await self._post(data, uclassify_xml.check_status)
+
+    async def classify(self,texts,classifierName,username = None):
+        """Performs classification on texts.
+           :param texts: (required) A List of texts that needs to be classified.
+           :param classifierName: (required) Classifier Name
+           :param username: (optional): Name of the user, under whom the classifier exists.
+        """
+        self._checkReadKey()
+        return await self._sendBatches(lambda batch: self._classify(b"classify", batch, classifierName, username), texts)
+
+    async def classifyKeywords(self,texts,classifierName,username = None):
+        """Performs classification on texts.
+           :param texts: (required) A List of texts that needs to be classified.
+           :param classifierName: (required) Classifier Name
+           :param username: (optional): Name of the user, under whom the classifier exists.
+        """
+        self._checkReadKey()
+        return await self._sendBatches(lambda batch: self._classify(b"classifyKeywords", batch, classifierName, username), texts)
+
+    async def _classify(self,tag,texts,classifierName,username):
+        data = uclassify_xml.build_classify(tag,self.readApiKey,texts,classifierName,username)
+        parse = lambda content: [(texts[text_index],text_coverage,cresult) for text_index, text_coverage, cresult
+                                 in uclassify_xml.iter_classify_response(content)]
+        result = await self._post(data, parse)
+        if len(result) != len(texts):
+            raise uClassifyError("%s returned %d results for %d texts" % (tag.decode('ascii'), len(result), len(texts)))
+        return result
+
+    async def getInformation(self,classifierName):
+        """Returns Information about the Classifier in a List.
+           :param classifierName: (required) Classifier Name
+        """
+        self._checkReadKey()
+        data = uclassify_xml.build_get_information(self.readApiKey,classifierName)
+        return await self._post(data, uclassify_xml.parse_class_information)
+
+    async def removeClassifier(self,classifierName):
+        """Removes Classifier.
+           :param classifierName(required): Classifier Name
+        """
+        self._checkWriteKey()
+        data = uclassify_xml.build_remove_classifier(self.writeApiKey,classifierName)
+        await self._post(data, uclassify_xml.check_status)
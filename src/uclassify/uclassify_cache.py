@@ -0,0 +1,95 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    """
+       Persistent, size bounded cache of classification responses.
+       Entries are content addressed by a hash of (endpoint, classifier, normalized text) and the
+       least recently used ones are evicted once the stored values exceed max_bytes.
+    """
+    def __init__(self,path,max_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS responses "
+                        "(key TEXT PRIMARY KEY, value BLOB, size INTEGER, last_used REAL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.db.commit()
+        self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def normalize(text):
+        if not isinstance(text, bytes):
+            text = text.encode('utf-8')
+        return b' '.join(text.split())
+
+    @classmethod
+    def key(cls,endpoint,classifier,text):
+        """Returns the cache key of a text classified by classifier at endpoint.
+           :param endpoint: (required) URL or call name of the service
+           :param classifier: (required) Identity of the classifier that scores the text
+           :param text: (required) The text as sent to the service
+        """
+        digest = hashlib.sha1()
+        for part in (endpoint, classifier):
+            if not isinstance(part, bytes):
+                part = part.encode('utf-8')
+            digest.update(part + b'\0')
+        digest.update(cls.normalize(text))
+        return digest.hexdigest()
+
+    def get(self,key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self,keys):
+        """Returns a dict with the cached values (bytes) of those keys that are present."""
+        found = {}
+        with self.lock:
+            for key in set(keys):
+                row = self.db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    found[key] = bytes(row[0])
+            if found:
+                now = time.time()
+                self.db.executemany("UPDATE responses SET last_used = ? WHERE key = ?",
+                                    [(now, key) for key in found])
+                self.db.commit()
+        return found
+
+    def put(self,key,value):
+        self.put_many({key: value})
+
+    def put_many(self,values):
+        if not values:
+            return
+        now = time.time()
+        with self.lock:
+            for key, value in values.items():
+                old = self.db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                if old is not None:
+                    self.total_bytes -= old[0]
+                self.db.execute("INSERT OR REPLACE INTO responses (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                                (key, sqlite3.Binary(value), len(value), now))
+                self.total_bytes += len(value)
+            self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            rows = self.db.execute("SELECT key, size FROM responses ORDER BY last_used, rowid LIMIT 256").fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            for key, size in rows:
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,216 @@
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+
+from .uclassify_eh import uClassifyError
+from .uclassify_tokens import DEFAULT_TOKEN_CONFIG, tokenize
+
+
+class _Classifier:
+    def __init__(self):
+        # class names, in the row order of counts
+        self.classes = []
+        # token counts per (class, feature); columns are allocated ahead of the shared vocabulary
+        self.counts = np.zeros((0, 1024), dtype=np.int64)
+        self.log_prob = None
+        self.seen = None
+
+
+class LocalUclassify:
+    """
+       In-process multinomial Naive Bayes engine with the API of the uclassify client, for offline runs
+       and as a stand-in for the remote service. Texts are split into tokens by uclassify_tokens.tokenize, with
+       the token_pattern and lowercase settings of config; every classifier keeps one row of token counts per
+       class and scores a whole batch with one sparse matrix product.
+       Like the service, classes have equal priors and tokens a classifier has never seen are ignored.
+    """
+    def __init__(self,config=DEFAULT_TOKEN_CONFIG):
+        """
+           :param config: (optional) Token settings; a features.py config works too, its n-gram settings are ignored.
+        """
+        self.config = config
+        self.writeApiKey=None
+        self.readApiKey=None
+        # token -> feature column, shared by all classifiers of this engine
+        self.features = {}
+        self.classifiers = {}
+        # serializes vocabulary growth, so folds trained from several threads get distinct columns
+        self.lock = threading.Lock()
+
+    def setWriteApiKey(self,key):
+        self.writeApiKey = key
+
+    def setReadApiKey(self,key):
+        self.readApiKey = key
+
+    def setCache(self,cache):
+        """Accepted for compatibility with uclassify; scoring locally is cheaper than a cache lookup."""
+        pass
+
+    def close(self):
+        pass
+
+    def _classifier(self,classifierName):
+        if classifierName not in self.classifiers:
+            raise uClassifyError("Classifier %s does not exist" % classifierName, 4000)
+        return self.classifiers[classifierName]
+
+    def _classIndex(self,classifier,className):
+        if className not in classifier.classes:
+            raise uClassifyError("Class %s does not exist" % className, 4000)
+        return classifier.classes.index(className)
+
+    def _featurize(self,texts,grow):
+        """Returns the (texts x features) CSR matrix of token counts and the number of tokens of every text.
+           :param grow: (required) Whether unknown tokens get a feature column, or are left out of the matrix.
+        """
+        features = self.features
+        indptr = [0]
+        indices = []
+        n_tokens = np.zeros(len(texts))
+        for i, text in enumerate(texts):
+            tokens = tokenize(text, self.config)
+            n_tokens[i] = len(tokens)
+            for token in tokens:
+                column = features.get(token)
+                if column is None:
+                    if not grow:
+                        continue
+                    column = features[token] = len(features)
+                indices.append(column)
+            indptr.append(len(indices))
+        matrix = sp.csr_matrix((np.ones(len(indices)), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+                               shape=(len(texts), len(features)))
+        matrix.sum_duplicates()
+        return matrix, n_tokens
+
+    def _counts(self,classifier):
+        """Counts of the classifier over the current vocabulary, growing its allocation when needed."""
+        n_features = len(self.features)
+        capacity = classifier.counts.shape[1]
+        if capacity < n_features:
+            while capacity < n_features:
+                capacity *= 2
+            counts = np.zeros((len(classifier.classes), capacity), dtype=np.int64)
+            counts[:, :classifier.counts.shape[1]] = classifier.counts
+            classifier.counts = counts
+        return classifier.counts[:, :n_features]
+
+    def _update(self,texts,className,classifierName,sign):
+        classifier = self._classifier(classifierName)
+        row = self._classIndex(classifier, className)
+        with self.lock:
+            matrix, _ = self._featurize(texts, grow=sign > 0)
+            delta = np.asarray(matrix.sum(axis=0), dtype=np.int64).ravel()
+            counts = self._counts(classifier)
+            counts[row, :delta.shape[0]] += sign * delta
+            np.maximum(counts[row], 0, out=counts[row])
+            classifier.log_prob = None
+
+    def _logProb(self,classifier):
+        """(classes x features) Laplace smoothed log P(feature|class), zero for features the classifier has not seen."""
+        counts = self._counts(classifier)
+        if classifier.log_prob is None or classifier.log_prob.shape[1] != counts.shape[1]:
+            seen = counts.sum(axis=0) > 0
+            totals = counts.sum(axis=1, keepdims=True) + np.count_nonzero(seen)
+            log_prob = np.log(counts + 1.0) - np.log(np.maximum(totals, 1))
+            log_prob[:, ~seen] = 0.0
+            classifier.log_prob = log_prob
+            classifier.seen = seen
+        return classifier.log_prob, classifier.seen
+
+    def create(self,classifierName):
+        """Creates a new classifier.
+           :param classifierName: (required) The Classifier Name you are going to create.
+        """
+        if classifierName in self.classifiers:
+            raise uClassifyError("Classifier %s already exists" % classifierName, 4000)
+        self.classifiers[classifierName] = _Classifier()
+
+    def addClass(self,className,classifierName):
+        """Adds class to an existing Classifier.
+           :param className: (required) A List containing various classes that has to be added for the given Classifier.
+           :param classifierName: (required) Classifier where the classes will be added to.
+        """
+        classifier = self._classifier(classifierName)
+        new = [clas for clas in className if clas not in classifier.classes]
+        if new:
+            classifier.classes.extend(new)
+            classifier.counts = np.vstack([classifier.counts,
+                                           np.zeros((len(new), classifier.counts.shape[1]), dtype=np.int64)])
+            classifier.log_prob = None
+
+    def removeClass(self,className,classifierName):
+        """Removes class from an existing Classifier.
+           :param className: (required) A List containing various classes that will be removed from the given Classifier.
+           :param classifierName: (required) Classifier
+        """
+        classifier = self._classifier(classifierName)
+        rows = [self._classIndex(classifier, clas) for clas in className]
+        classifier.counts = np.delete(classifier.counts, rows, axis=0)
+        classifier.classes = [clas for i, clas in enumerate(classifier.classes) if i not in rows]
+        classifier.log_prob = None
+
+    def train(self,texts,className,classifierName):
+        """Performs training on a single classs.
+           :param texts: (required) A List of text used up for training.
+           :param className: (required) Name of the class that needs to be trained.
+           :param classifierName: (required) Name of the Classifier
+        """
+        self._update(texts, className, classifierName, 1)
+
+    def untrain(self,texts,className,classifierName):
+        """Performs untraining on text for a specific class.
+           :param texts: (required) A List of text used up for training.
+           :param className: (required) Name of the class.
+           :param classifierName: (required) Name of the Classifier
+        """
+        self._update(texts, className, classifierName, -1)
+
+    def classify(self,texts,classifierName,username = None):
+        """Performs classification on texts.
+           :param texts: (required) A List of texts that needs to be classified.
+           :param classifierName: (required) Classifier Name
+           :param username: (optional): Ignored, all classifiers are local.
+        """
+        classifier = self._classifier(classifierName)
+        if not classifier.classes:
+            raise uClassifyError("Classifier %s has no classes" % classifierName, 4000)
+        with self.lock:
+            # both over the same vocabulary, however other threads train meanwhile
+            matrix, n_tokens = self._featurize(texts, grow=False)
+            log_prob, seen = self._logProb(classifier)
+        scores = np.asarray(matrix.dot(log_prob.T))
+        scores -= scores.max(axis=1, keepdims=True)
+        p = np.exp(scores)
+        p /= p.sum(axis=1, keepdims=True)
+        known = matrix.dot(seen.astype(np.float64))
+        coverage = np.where(n_tokens > 0, known / np.maximum(n_tokens, 1), 0.0)
+        return [(text, float(coverage[i]), list(zip(classifier.classes, p[i].tolist())))
+                for i, text in enumerate(texts)]
+
+    def classifyKeywords(self,texts,classifierName,username = None):
+        """Performs classification on texts.
+           :param texts: (required) A List of texts that needs to be classified.
+           :param classifierName: (required) Classifier Name
+           :param username: (optional): Ignored, all classifiers are local.
+        """
+        return self.classify(texts, classifierName, username)
+
+    def getInformation(self,classifierName):
+        """Returns Information about the Classifier in a List.
+           :param classifierName: (required) Classifier Name
+        """
+        classifier = self._classifier(classifierName)
+        with self.lock:
+            counts = self._counts(classifier)
+        return [(clas, str(np.count_nonzero(counts[i])), str(counts[i].sum()))
+                for i, clas in enumerate(classifier.classes)]
+
+    def removeClassifier(self,classifierName):
+        """Removes Classifier.
+           :param classifierName(required): Classifier Name
+        """
+        self._classifier(classifierName)
+        del self.classifiers[classifierName]
@@ -0,0 +1,19 @@
+import re
+
+# Token settings of LocalUclassify; features.py builds its hashed n-gram config on top of them
+DEFAULT_TOKEN_CONFIG = {
+    'token_pattern': r"\w+",
+    'lowercase': True,
+}
+
+
+def tokenize(text,config=DEFAULT_TOKEN_CONFIG):
+    """Splits a text into tokens.
+       :param text: (required) Text as unicode, or as UTF-8 bytes.
+       :param config: (optional) Dict with the token_pattern and lowercase settings; other keys are ignored.
+    """
+    if isinstance(text, bytes):
+        text = text.decode('utf-8', 'replace')
+    if config['lowercase']:
+        text = text.lower()
+    return re.findall(config['token_pattern'], text, re.UNICODE)
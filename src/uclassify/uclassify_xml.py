@@ -0,0 +1,210 @@
+import base64
+from io import BytesIO
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+from .uclassify_eh import uClassifyError
+
+REQUEST_SCHEMA = "http://api.uclassify.com/1/RequestSchema"
+_HEADER = ('<?xml version="1.0" ?><uclassify version="1.01" xmlns="%s">' % REQUEST_SCHEMA).encode('ascii')
+_FOOTER = b'</uclassify>'
+# Bytes of XML markup around every text of a request, on top of its base64 payload
+TEXT_MARKUP_BYTES = 160
+
+
+def _bytes(value):
+    if not isinstance(value, bytes):
+        value = value.encode('utf-8')
+    return value
+
+
+def _escape(value):
+    # the same characters xml.dom.minidom escapes when writing attributes and text
+    return _bytes(value).replace(b"&", b"&amp;").replace(b"<", b"&lt;").replace(b"\"", b"&quot;").replace(b">", b"&gt;")
+
+
+class RequestWriter:
+    """
+       Serializes a uClassify RequestSchema document straight into a list of byte chunks.
+       The output is byte-identical to building the document with xml.dom.minidom and calling toxml():
+       attributes are written sorted by name and empty elements are self-closed.
+    """
+    def __init__(self):
+        self.chunks = [_HEADER]
+
+    def _open(self,tag,attributes):
+        self.chunks.append(b'<' + tag)
+        for name, value in sorted(attributes):
+            self.chunks.append(b' ' + name + b'="' + _escape(value) + b'"')
+
+    def start(self,tag,attributes=()):
+        self._open(tag, attributes)
+        self.chunks.append(b'>')
+
+    def end(self,tag):
+        self.chunks.append(b'</' + tag + b'>')
+
+    def empty(self,tag,attributes=()):
+        self._open(tag, attributes)
+        self.chunks.append(b'/>')
+
+    def texts(self,ids,texts):
+        """Writes the <texts> element with one base64 encoded <textBase64> per text."""
+        if not texts:
+            self.chunks.append(b'<texts/>')
+            return
+        chunks = self.chunks
+        chunks.append(b'<texts>')
+        for text_id, text in zip(ids, texts):
+            chunks.append(b'<textBase64 id="' + _escape(text_id) + b'">')
+            chunks.append(base64.b64encode(_bytes(text)))
+            chunks.append(b'</textBase64>')
+        chunks.append(b'</texts>')
+
+    def calls(self,tag,attributes,children):
+        """Writes a readCalls/writeCalls element around (tag, attributes) children."""
+        if not children:
+            self.empty(tag, attributes)
+            return
+        self.start(tag, attributes)
+        for child_tag, child_attributes in children:
+            self.empty(child_tag, child_attributes)
+        self.end(tag)
+
+    def getvalue(self):
+        return b''.join(self.chunks) + _FOOTER
+
+
+def iter_batches(texts,batch_size,batch_bytes):
+    """Splits texts into consecutive batches of at most batch_size texts and about batch_bytes of request.
+       A text takes the base64 of its UTF-8 encoding, which needs no XML escaping, plus its markup.
+    """
+    batch = []
+    size = 0
+    for text in texts:
+        text_bytes = 4 * ((len(_bytes(text)) + 2) // 3) + TEXT_MARKUP_BYTES
+        if batch and (len(batch) >= batch_size or size + text_bytes > batch_bytes):
+            yield batch
+            batch = []
+            size = 0
+        batch.append(text)
+        size += text_bytes
+    if batch:
+        yield batch
+
+
+def _write_calls(writeApiKey,classifierName,children):
+    writer = RequestWriter()
+    writer.calls(b'writeCalls', [(b'writeApiKey', writeApiKey), (b'classifierName', classifierName)], children)
+    return writer.getvalue()
+
+
+def build_create(writeApiKey,classifierName,cur_time):
+    return _write_calls(writeApiKey, classifierName,
+                        [(b'create', [(b'id', cur_time + "create" + classifierName)])])
+
+
+def build_class_calls(tag,idprefix,writeApiKey,className,classifierName):
+    """Request of addClass/removeClass calls, one per class name."""
+    return _write_calls(writeApiKey, classifierName,
+                        [(tag, [(b'id', idprefix + clas), (b'className', clas)]) for clas in className])
+
+
+def build_train(tag,idprefix,writeApiKey,texts,className,classifierName):
+    """Request of train/untrain calls, one per text."""
+    ids = [className + "Text" + str(counter) for counter in range(1, len(texts) + 1)]
+    writer = RequestWriter()
+    writer.texts(ids, texts)
+    writer.calls(b'writeCalls', [(b'writeApiKey', writeApiKey), (b'classifierName', classifierName)],
+                 [(tag, [(b'id', idprefix + className + str(counter)), (b'className', className),
+                         (b'textId', text_id)])
+                  for counter, text_id in enumerate(ids, 1)])
+    return writer.getvalue()
+
+
+def build_classify(tag,readApiKey,texts,classifierName,username=None):
+    """Request of classify/classifyKeywords calls, one per text."""
+    ids = ["Classifytext" + str(counter) for counter in range(1, len(texts) + 1)]
+    children = []
+    for counter, text_id in enumerate(ids, 1):
+        attributes = [(b'id', "Classify" + str(counter)), (b'classifierName', classifierName), (b'textId', text_id)]
+        if username != None:
+            attributes.append((b'username', username))
+        children.append((tag, attributes))
+    writer = RequestWriter()
+    writer.texts(ids, texts)
+    writer.calls(b'readCalls', [(b'readApiKey', readApiKey)], children)
+    return writer.getvalue()
+
+
+def build_get_information(readApiKey,classifierName):
+    writer = RequestWriter()
+    writer.calls(b'readCalls', [(b'readApiKey', readApiKey)],
+                 [(b'getInformation', [(b'id', "GetInformation"), (b'classifierName', classifierName)])])
+    return writer.getvalue()
+
+
+def build_remove_classifier(writeApiKey,classifierName):
+    return _write_calls(writeApiKey, classifierName, [(b'remove', [(b'id', "Remove")])])
+
+
+def _localname(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_classify_response(source):
+    """Parses a classify/classifyKeywords response in a single event driven pass.
+       Yields (text_index, coverage, [(className, p)]) as every classification element is closed, with
+       coverage and probabilities as floats, and raises uClassifyError as soon as a failed status is read.
+       :param source: (required) Response bytes, or a file-like object the response is streamed from.
+    """
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+    text_index = 0
+    for event, elem in ElementTree.iterparse(source, events=('end',)):
+        tag = _localname(elem.tag)
+        if tag == 'classification':
+            classes = [(ctag.get('className'), float(ctag.get('p'))) for ctag in elem
+                       if _localname(ctag.tag) == 'class']
+            yield text_index, float(elem.get('textCoverage')), classes
+            text_index += 1
+            elem.clear()
+        elif tag == 'classify' or tag == 'classifyKeywords':
+            elem.clear()
+        elif tag == 'status':
+            if elem.get('success') == 'false':
+                raise uClassifyError(elem.text or '', elem.get('statusCode'))
+
+
+def check_status(source):
+    """Reads the status of a response and raises uClassifyError if the call failed.
+       :param source: (required) Response bytes, or a file-like object the response is streamed from.
+    """
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+    for event, elem in ElementTree.iterparse(source, events=('end',)):
+        if _localname(elem.tag) == 'status':
+            if elem.get('success') == 'false':
+                raise uClassifyError(elem.text or '', elem.get('statusCode'))
+            return
+    raise uClassifyError("Response without status")
+
+
+def parse_class_information(source):
+    """Parses a getInformation response into (className, uniqueFeatures, totalCount) tuples.
+       :param source: (required) Response bytes, or a file-like object the response is streamed from.
+    """
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+    result = []
+    for event, elem in ElementTree.iterparse(source, events=('end',)):
+        tag = _localname(elem.tag)
+        if tag == 'classInformation':
+            counts = dict((_localname(child.tag), child.text) for child in elem)
+            result.append((elem.get('className'), counts.get('uniqueFeatures'), counts.get('totalCount')))
+            elem.clear()
+        elif tag == 'status':
+            if elem.get('success') == 'false':
+                raise uClassifyError(elem.text or '', elem.get('statusCode'))
+    return result